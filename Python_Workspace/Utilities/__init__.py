@@ -1,51 +1,305 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from zipfile import PyZipFile, ZIP_STORED
 
 import shutil
 
 import io
-from Utilities.unpyc3 import decompile
+import time
+from Utilities.unpyc3 import decompile, read_pyc, dec_module_code, count_instructions
+from Utilities.decompile_cache import DecompileCache
+from Utilities.decompile_report import DecompileReport, new_result
+from Utilities.extract_manifest import ExtractManifest, archive_members, central_directory_crc
+from Utilities.symbol_index import SymbolCollector, SymbolIndex
+from Utilities.module_catalogue import ModuleCatalogue, LazyDecompiler
+from Utilities.mod_build import BuildManifest, build_archive, deploy_file, sync_folder
+from Utilities.mod_watch import create_watcher, watch
 import fnmatch
 import os
 
+# ProcessPoolExecutor refuses more than 61 workers on Windows
+max_windows_workers = 61
 
-def decompile_dir(rootPath):
+
+def default_workers():
+    workers = os.cpu_count() or 1
+    if os.name == 'nt':
+        workers = min(workers, max_windows_workers)
+    return workers
+
+
+def output_path(p):
+    return p.replace('.pyc', '.py')
+
+
+def failed_result(result, ex):
+    result.update(status='failed', error_type=type(ex).__name__, error=str(ex),
+                  opname=getattr(ex, 'unpyc3_opname', None),
+                  offset=getattr(ex, 'unpyc3_offset', None),
+                  code_name=getattr(ex, 'unpyc3_code_name', None))
+    return result
+
+
+# Version of the output decompile_to_file writes, part of every cache key
+# and index digest: bump it whenever the writer changes what ends up in
+# the .py files
+output_format = 1
+
+
+def decompile_to_file(src, data, py_path, collect_symbols=False):
+    # Runs in the pool workers, so failures are returned in the result:
+    # the unpyc3 details attached to an exception do not survive pickling
+    result = new_result(src)
+    collector = SymbolCollector() if collect_symbols else None
+    start = time.perf_counter()
+    try:
+        if data is None:
+            with open(src, 'rb') as f:
+                data = f.read()
+        code_obj = read_pyc(data)
+        result['instructions'] = count_instructions(code_obj)
+        py = dec_module_code(code_obj)
+        # Always CRLF, as on Windows, so the '\r' between statements
+        # never merges with a following '\n' and index line numbers hold
+        with io.open(py_path, 'w', newline='\r\n') as output_py:
+            for statement in py.statements:
+                if collector is None:
+                    statement.emit(output_py)
+                else:
+                    collector.line += statement.emit(output_py, collector.define)
+                output_py.write('\r')
+        result['output_size'] = os.path.getsize(py_path)
+        if collector is not None:
+            result['symbols'] = collector.symbols
+    except Exception as ex:
+        failed_result(result, ex)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def decompile_file(p):
+    return decompile_to_file(p, None, output_path(p))
+
+
+def decompile_jobs(jobs, workers=None, cache=None, report=None, index=None):
+    # Each job is a (src, data, py_path) tuple: src is the .pyc path used
+    # in reports, data its bytes if already in memory (else src is read).
+    # Returns the src of every job that failed
+    keys = {}
+    digests = {}
+    failed = []
+    if cache is not None or index is not None:
+        pending = []
+        for src, data, py_path in jobs:
+            if data is None:
+                with open(src, 'rb') as f:
+                    data = f.read()
+            if index is not None:
+                digests[src] = index.digest(data)
+            if cache is not None:
+                keys[src] = cache.key(data)
+            # A cached module can only be reused if the index already has
+            # its symbols, as those are collected while decompiling
+            cached = False
+            if cache is not None:
+                if index is None or index.is_current(py_path, digests[src]):
+                    cached = cache.fetch(keys[src], py_path)
+                else:
+                    cache.misses += 1
+            if cached:
+                if report is not None:
+                    result = new_result(src)
+                    result.update(status='cached', output_size=os.path.getsize(py_path))
+                    report.add(result)
+                print(src)
+            else:
+                pending.append((src, data, py_path))
+        jobs = pending
+
+    def finished(result, py_path):
+        src = result['src']
+        symbols = result.pop('symbols', None)
+        if result['status'] == 'ok':
+            if cache is not None:
+                cache.store(keys[src], py_path)
+            if index is not None:
+                index.update(py_path, digests[src], symbols)
+            print(src)
+        else:
+            if index is not None:
+                index.remove(py_path)
+            failed.append(src)
+            print("FAILED to decompile %s" % src)
+        if report is not None:
+            report.add(result)
+
+    if workers is None:
+        workers = default_workers()
+    collect_symbols = index is not None
+    if workers <= 1 or len(jobs) <= 1:
+        for src, data, py_path in jobs:
+            finished(decompile_to_file(src, data, py_path, collect_symbols), py_path)
+    else:
+        # Each worker re-imports unpyc3, so scripts calling this must be
+        # guarded by "if __name__ == '__main__'" for the spawn start method
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = {pool.submit(decompile_to_file, *job, collect_symbols): job for job in jobs}
+            for future in as_completed(futures):
+                src, data, py_path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as ex:
+                    # The worker itself died, e.g. BrokenProcessPool
+                    result = failed_result(new_result(src), ex)
+                finished(result, py_path)
+    if index is not None:
+        index.save()
+    return failed
+
+
+def decompile_files(paths, workers=None, cache=None, report=None, index=None):
+    return decompile_jobs([(p, None, output_path(p)) for p in paths], workers, cache, report, index)
+
+
+def decompile_dir(rootPath, workers=None, cache=None, report=None, index=None):
     pattern = '*.pyc'
+    paths = []
     for root, dirs, files in os.walk(rootPath):
         for filename in fnmatch.filter(files, pattern):
-            p = str(os.path.join(root, filename))
-            try:
-                py = decompile(p)
-                with io.open(p.replace('.pyc', '.py'), 'w') as output_py:
-                    for statement in py.statements:
-                        output_py.write(str(statement) + '\r')
-                print(p)
-            except Exception as ex:
-                print("FAILED to decompile %s" % p)
+            paths.append(str(os.path.join(root, filename)))
+    return decompile_files(paths, workers, cache, report, index)
 
 
 script_package_types = ['*.zip', '*.ts4script']
 
 
-def extract_subfolder(root, filename, ea_folder):
+def remove_member(out_folder, name):
+    path = os.path.join(out_folder, *name.split('/'))
+    for p in (path, output_path(path)) if path.endswith('.pyc') else (path,):
+        if os.path.isfile(p):
+            os.remove(p)
+
+
+def stream_members(zip, names, out_folder, keep_pyc):
+    # Read each .pyc member straight out of the archive and hand the bytes
+    # to the decompiler, so only the .py output has to touch the disk
+    jobs = []
+    for name in names:
+        if not name.endswith('.pyc'):
+            zip.extract(name, out_folder)
+            continue
+        data = zip.read(name)
+        pyc_path = os.path.join(out_folder, *name.split('/'))
+        os.makedirs(os.path.dirname(pyc_path), exist_ok=True)
+        if keep_pyc:
+            with open(pyc_path, 'wb') as f:
+                f.write(data)
+        jobs.append((pyc_path, data, output_path(pyc_path)))
+    return jobs
+
+
+def extract_subfolder(root, filename, ea_folder, workers=None, cache=None, manifest=None,
+                      stream=False, keep_archive=True, keep_pyc=True, report=None, index=None):
     src = os.path.join(root, filename)
     dst = os.path.join(ea_folder, filename)
-    if src != dst:
-        shutil.copyfile(src, dst)
-    zip = PyZipFile(dst)
     out_folder = os.path.join(ea_folder, os.path.splitext(filename)[0])
-    zip.extractall(out_folder)
-    decompile_dir(out_folder)
-    pass
+    entry = None
+    # A new index has to see every module of the archive once
+    reindex = index is not None and not index.has_folder(out_folder)
+    if manifest is not None and not reindex:
+        if manifest.is_unchanged(src, out_folder):
+            print("Unchanged %s" % src)
+            return
+        if os.path.isdir(out_folder):
+            entry = manifest.get(src)
+    if entry is not None:
+        with PyZipFile(src) as zip:
+            if central_directory_crc(zip) == entry['central_crc'] and manifest.is_current(src):
+                # Touched (new mtime) but not modified
+                manifest.update(src, zip, manifest.failed(src))
+                manifest.save()
+                print("Unchanged %s" % src)
+                return
+    if stream and not keep_archive:
+        zip = PyZipFile(src)
+    else:
+        if src != dst:
+            shutil.copyfile(src, dst)
+        zip = PyZipFile(dst)
+    if entry is None:
+        names = zip.namelist()
+    else:
+        old_members = entry['members']
+        members = archive_members(zip)
+        for name in old_members:
+            if name not in members:
+                remove_member(out_folder, name)
+                if index is not None and name.endswith('.pyc'):
+                    index.remove(output_path(os.path.join(out_folder, *name.split('/'))))
+        if manifest.is_current(src):
+            names = [name for name, member in members.items() if old_members.get(name) != member]
+        else:
+            # Another decompiler may write different output, or decompile
+            # the members this one failed on
+            names = list(members)
+    if stream:
+        failed = decompile_jobs(stream_members(zip, names, out_folder, keep_pyc), workers, cache, report, index)
+    elif entry is None:
+        zip.extractall(out_folder)
+        failed = decompile_dir(out_folder, workers, cache, report, index)
+    else:
+        paths = [zip.extract(name, out_folder) for name in names]
+        failed = decompile_files(fnmatch.filter(paths, '*.pyc'), workers, cache, report, index)
+    if index is not None:
+        # Also for archives without any module, so they are not re-indexed
+        # on every run
+        index.add_folder(out_folder)
+        index.save()
+    if manifest is not None:
+        failed = [os.path.relpath(path, out_folder).replace(os.sep, '/') for path in failed]
+        if entry is not None and manifest.is_current(src):
+            # Members that failed last time and did not change were not
+            # decompiled again, and still fail
+            retried = set(names)
+            failed += [name for name in manifest.failed(src) if name in members and name not in retried]
+        manifest.update(src, zip, failed)
+        manifest.save()
+    zip.close()
+
+
+def extract_folder(ea_folder, gameplay_folder, workers=None, cache=None, incremental=True,
+                   stream=False, keep_archive=True, keep_pyc=True, report=None, index=None):
+    manifest = ExtractManifest.for_folder(ea_folder) if incremental else None
+    for root, dirs, files in os.walk(gameplay_folder):
+        for ext_filter in script_package_types:
+            for filename in fnmatch.filter(files, ext_filter):
+                extract_subfolder(root, filename, ea_folder, workers, cache, manifest,
+                                  stream, keep_archive, keep_pyc, report, index)
 
 
-def extract_folder(ea_folder, gameplay_folder):
+def catalogue_folder(ea_folder, gameplay_folder, catalogue=None):
+    # The lazy alternative to extract_folder: record where every module
+    # is, for LazyDecompiler to decompile on demand
+    if catalogue is None:
+        catalogue = ModuleCatalogue.for_folder(ea_folder)
     for root, dirs, files in os.walk(gameplay_folder):
         for ext_filter in script_package_types:
             for filename in fnmatch.filter(files, ext_filter):
-                extract_subfolder(root, filename, ea_folder)
+                catalogue.add_archive(os.path.join(root, filename))
+    catalogue.save()
+    return catalogue
 
 
-def compile_module(creator_name, root, mods_folder,mod_name=None):
+def compile_module(creator_name, root, mods_folder,mod_name=None, incremental=False, workers=None,
+                   deterministic=False):
+    """
+    Build root/Scripts into <creator_name>_<mod_name>.ts4script and copy
+    it to mods_folder.  With incremental, compiled modules are kept in
+    root/build and only modules whose source changed are recompiled, in
+    a process pool of workers processes when there are several.  A
+    deterministic build always gives the same archive for the same
+    sources, so unchanged builds match the copy in mods_folder, which is
+    then not copied again.  Returns True if the copy was replaced.
+    """
     src = os.path.join(root, 'Scripts')
     if not mod_name:
         mod_name=os.path.basename(os.path.normpath(os.path.dirname(os.path.realpath('__file__'))))
@@ -55,8 +309,12 @@ def compile_module(creator_name, root, mods_folder,mod_name=None):
 
     ts4script_mods = os.path.join(os.path.join(mods_folder), mod_name + '.ts4script')
 
-    zf = PyZipFile(ts4script, mode='w', compression=ZIP_STORED, allowZip64=True, optimize=2)
-    for folder, subs, files in os.walk(src):
-        zf.writepy(folder)
-    zf.close()
-    shutil.copyfile(ts4script, ts4script_mods)
+    if incremental or deterministic:
+        build_archive(src, ts4script, os.path.join(root, 'build'), optimize=2, workers=workers,
+                      deterministic=deterministic)
+    else:
+        zf = PyZipFile(ts4script, mode='w', compression=ZIP_STORED, allowZip64=True, optimize=2)
+        for folder, subs, files in os.walk(src):
+            zf.writepy(folder)
+        zf.close()
+    return deploy_file(ts4script, ts4script_mods)
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import shutil
+
+from Utilities import unpyc3
+
+
+def decompiler_version():
+    # Any edit to unpyc3 can change the output, so its source is hashed
+    # into every key, along with the version of the format
+    # decompile_to_file writes (imported here, as the Utilities package
+    # imports this module)
+    from Utilities import output_format
+    h = hashlib.sha1(b'%d\n' % output_format)
+    with open(unpyc3.__file__, 'rb') as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+
+class DecompileCache:
+    """
+    Persistent cache of decompiled .py output, keyed by the hash of the
+    .pyc bytes and the unpyc3 version.  Entries are evicted least recently
+    used first (by file mtime, refreshed on every hit) once the cache
+    grows past max_size bytes.
+    """
+
+    def __init__(self, folder, max_size=1024 * 1024 * 1024):
+        self.folder = folder
+        self.max_size = max_size
+        self.version = decompiler_version().encode()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sizes = None
+        self._total = 0
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    def key(self, data):
+        h = hashlib.sha256(self.version)
+        h.update(data)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.folder, key[:2], key + '.py')
+
+    def fetch(self, key, dst):
+        src = self.path(key)
+        try:
+            shutil.copyfile(src, dst)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        os.utime(src)
+        self.hits += 1
+        return True
+
+    def store(self, key, src):
+        dst = self.path(key)
+        folder = os.path.dirname(dst)
+        if not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        tmp = dst + '.tmp'
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+        sizes = self._load_sizes()
+        self._total += os.path.getsize(dst) - sizes.get(dst, 0)
+        sizes[dst] = os.path.getsize(dst)
+        if self._total > self.max_size:
+            self.evict()
+
+    def evict(self):
+        sizes = self._load_sizes()
+        entries = []
+        for path in sizes:
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                pass
+        entries.sort()
+        # Evict down to 90% of the cap so a full cache does not rescan
+        # on every store
+        target = self.max_size * 0.9
+        for mtime, path in entries:
+            if self._total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._total -= sizes.pop(path)
+            self.evictions += 1
+
+    def _load_sizes(self):
+        if self._sizes is None:
+            self._sizes = {}
+            for root, dirs, files in os.walk(self.folder):
+                for filename in files:
+                    if filename.endswith('.py'):
+                        path = os.path.join(root, filename)
+                        self._sizes[path] = os.path.getsize(path)
+            self._total = sum(self._sizes.values())
+        return self._sizes
+
+    def report(self):
+        return "Decompile cache: %d hits, %d misses, %d evicted" % (self.hits, self.misses, self.evictions)
@@ -0,0 +1,78 @@
+import csv
+import json
+from collections import Counter
+
+fields = ['src', 'status', 'seconds', 'instructions', 'output_size',
+          'error_type', 'opname', 'offset', 'code_name', 'error']
+
+
+def new_result(src):
+    result = dict.fromkeys(fields)
+    result.update(src=src, status='ok', seconds=0.0, instructions=0, output_size=0)
+    return result
+
+
+class DecompileReport:
+    """
+    Per-module results of a decompile run: time, instruction count,
+    output size, and for failures the exception and the opcode whose
+    handler raised it.
+    """
+
+    def __init__(self):
+        self.results = []
+
+    def add(self, result):
+        self.results.append(result)
+
+    def failures(self):
+        return [result for result in self.results if result['status'] == 'failed']
+
+    def slowest(self, count=20):
+        decompiled = [result for result in self.results if result['status'] != 'cached']
+        return sorted(decompiled, key=lambda result: result['seconds'], reverse=True)[:count]
+
+    def failure_histogram(self):
+        return Counter((result['opname'] or '<none>', result['error_type'])
+                       for result in self.failures())
+
+    def totals(self):
+        statuses = Counter(result['status'] for result in self.results)
+        return {
+            'modules': len(self.results),
+            'ok': statuses['ok'],
+            'cached': statuses['cached'],
+            'failed': statuses['failed'],
+            'seconds': sum(result['seconds'] for result in self.results),
+            'instructions': sum(result['instructions'] for result in self.results),
+        }
+
+    def write_json(self, path, count=20):
+        report = {
+            'totals': self.totals(),
+            'slowest': [[result['src'], result['seconds']] for result in self.slowest(count)],
+            'failures_by_opcode': [[opname, error_type, n] for (opname, error_type), n
+                                   in self.failure_histogram().most_common()],
+            'modules': self.results,
+        }
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    def write_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fields)
+            writer.writeheader()
+            writer.writerows(self.results)
+
+    def summary(self, count=20):
+        totals = self.totals()
+        lines = ["Decompiled {modules} modules: {ok} ok, {cached} cached, {failed} failed, "
+                 "{instructions} instructions in {seconds:.1f}s".format(**totals)]
+        lines.append("Slowest modules:")
+        for result in self.slowest(count):
+            lines.append("  {:8.3f}s {:8} instrs  {}".format(result['seconds'], result['instructions'], result['src']))
+        if totals['failed']:
+            lines.append("Failures by opcode handler:")
+            for (opname, error_type), n in self.failure_histogram().most_common():
+                lines.append("  {:6} {} ({})".format(n, opname, error_type))
+        return "\n".join(lines)
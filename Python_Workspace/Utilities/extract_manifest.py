@@ -0,0 +1,80 @@
+import json
+import os
+import zlib
+
+from Utilities.decompile_cache import decompiler_version
+
+
+def central_directory_crc(zip):
+    # CRC of everything from the central directory to the end of the
+    # archive, which changes whenever any member is added, removed or
+    # rewritten
+    with open(zip.filename, 'rb') as f:
+        f.seek(zip.start_dir)
+        return zlib.crc32(f.read())
+
+
+def archive_members(zip):
+    return {info.filename: [info.CRC, info.file_size] for info in zip.infolist()}
+
+
+class ExtractManifest:
+    """
+    Record of every archive extracted into an EA folder: its size,
+    mtime, central directory CRC, the CRC of each member, the members
+    that failed to decompile and the decompiler version used, so
+    extract_folder can skip unchanged archives and re-extract only the
+    members that differ.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.version = decompiler_version()
+        self.archives = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.archives = json.load(f)
+
+    @classmethod
+    def for_folder(cls, ea_folder):
+        ea_folder = os.path.abspath(ea_folder)
+        return cls(ea_folder + '.manifest.json')
+
+    def get(self, src):
+        return self.archives.get(os.path.abspath(src))
+
+    def is_current(self, src):
+        """True if src was last decompiled by this version of the decompiler"""
+        entry = self.get(src)
+        return entry is not None and entry.get('decompiler') == self.version
+
+    def failed(self, src):
+        """Members of src that failed to decompile"""
+        entry = self.get(src)
+        return entry.get('failed', []) if entry is not None else []
+
+    def is_unchanged(self, src, out_folder):
+        entry = self.get(src)
+        if not self.is_current(src) or not os.path.isdir(out_folder):
+            return False
+        st = os.stat(src)
+        return entry['size'] == st.st_size and entry['mtime'] == st.st_mtime_ns
+
+    def update(self, src, zip, failed=()):
+        # Failed members keep their CRC, so they are only retried once
+        # they change or the decompiler does
+        st = os.stat(src)
+        self.archives[os.path.abspath(src)] = {
+            'size': st.st_size,
+            'mtime': st.st_mtime_ns,
+            'central_crc': central_directory_crc(zip),
+            'members': archive_members(zip),
+            'failed': sorted(failed),
+            'decompiler': self.version,
+        }
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.archives, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
@@ -0,0 +1,381 @@
+import hashlib
+import importlib.util
+import json
+import marshal
+import os
+import shutil
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from zipfile import ZipFile, ZipInfo, ZIP_STORED
+
+
+def find_modules(src):
+    """
+    (member, path) of every module under src, named as PyZipFile.writepy
+    names them: from the outermost enclosing package, or at the top of
+    the archive for modules outside any package.  Unlike calling writepy
+    on every folder, nested packages are not added a second time at the
+    top of the archive.
+    """
+    modules = {}
+    top = os.path.dirname(os.path.abspath(src))
+    for folder, subs, files in os.walk(os.path.abspath(src)):
+        subs.sort()
+        base = folder
+        while base != top and os.path.isfile(os.path.join(base, '__init__.py')):
+            base = os.path.dirname(base)
+        for filename in sorted(files):
+            if filename.endswith('.py'):
+                path = os.path.join(folder, filename)
+                member = os.path.relpath(path, base)[:-len('.py')] + '.pyc'
+                modules[member.replace(os.sep, '/')] = path
+    return sorted(modules.items())
+
+
+# Fixed timestamp of every member of a deterministic archive
+deterministic_date_time = (1980, 1, 1, 0, 0, 0)
+
+
+def source_hash(source, optimize, filename):
+    # The interpreter's magic number is part of the hash, so switching
+    # Python versions recompiles everything
+    h = hashlib.sha256(importlib.util.MAGIC_NUMBER + bytes([optimize & 0xff]))
+    h.update(filename.encode('utf-8') + b'\0')
+    h.update(source)
+    return h.hexdigest()
+
+
+# Items of a code object in marshal data: int fields before its objects,
+# objects up to co_firstlineno and objects after it
+if sys.version_info >= (3, 11):
+    code_layout = (5, 8, 2)
+elif sys.version_info >= (3, 8):
+    code_layout = (6, 8, 1)
+else:
+    code_layout = (5, 8, 1)
+
+
+class MarshalNode:
+    __slots__ = ('kind', 'parts', 'shared')
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.parts = []
+        self.shared = False
+
+
+class MarshalParser:
+    """Parses marshal data into MarshalNodes, keeping back references"""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+        self.refs = []
+
+    def take(self, n):
+        start = self.pos
+        self.pos += n
+        if self.pos > len(self.data):
+            raise EOFError("EOF read where object expected")
+        return bytes(self.data[start:self.pos])
+
+    def take_sized(self, size):
+        n = self.take(size)
+        return n + self.take(int.from_bytes(n, 'little'))
+
+    def r_object(self):
+        code = self.take(1)[0]
+        kind = chr(code & 0x7f)
+        if kind == 'r':
+            node = self.refs[struct.unpack('<i', self.take(4))[0]]
+            node.shared = True
+            return node
+        node = MarshalNode(code & 0x7f)
+        if code & 0x80:
+            self.refs.append(node)
+        parts = node.parts
+        if kind in '0NFTS.':
+            pass
+        elif kind == 'i':
+            parts.append(self.take(4))
+        elif kind == 'l':
+            n = self.take(4)
+            parts += [n, self.take(2 * abs(struct.unpack('<i', n)[0]))]
+        elif kind in 'gy':
+            parts.append(self.take(8 if kind == 'g' else 16))
+        elif kind in 'fx':
+            parts += [self.take_sized(1) for i in range(1 if kind == 'f' else 2)]
+        elif kind in 'stuaA':
+            parts.append(self.take_sized(4))
+        elif kind in 'zZ':
+            parts.append(self.take_sized(1))
+        elif kind in ')([<>':
+            n = self.take(1 if kind == ')' else 4)
+            parts.append(n)
+            parts += [self.r_object() for i in range(int.from_bytes(n, 'little'))]
+        elif kind == '{':
+            while not parts or parts[-1].kind != ord('0'):
+                parts.append(self.r_object())
+        elif kind == 'c':
+            ints, before, after = code_layout
+            parts.append(self.take(4 * ints))
+            parts += [self.r_object() for i in range(before)]
+            parts.append(self.take(4))
+            parts += [self.r_object() for i in range(after)]
+        else:
+            raise ValueError("bad marshal data (unknown type code)")
+        return node
+
+
+def emit_marshal(node, out, refs):
+    if node.shared:
+        if node in refs:
+            out += b'r' + struct.pack('<i', refs[node])
+            return out
+        refs[node] = len(refs)
+        out.append(node.kind | 0x80)
+    else:
+        out.append(node.kind)
+    parts = node.parts
+    if node.kind == ord('>'):
+        parts = parts[:1] + sorted(parts[1:], key=lambda item: emit_marshal(item, bytearray(), {}))
+    for part in parts:
+        if isinstance(part, bytes):
+            out += part
+        else:
+            emit_marshal(part, out, refs)
+    return out
+
+
+def canonical_marshal(data):
+    """
+    Rewrite marshal data so it only depends on the values marshalled.
+    marshal flags objects for back references by their reference count
+    and writes frozensets in hash order, which both vary between
+    processes; here only objects referenced again are flagged, and
+    frozenset items are sorted.
+    """
+    return bytes(emit_marshal(MarshalParser(data).r_object(), bytearray(), {}))
+
+
+def compile_source(path, optimize, filename=None):
+    """
+    The .pyc py_compile would write for path, as bytes, with canonical
+    marshal data so it does not depend on the process compiling it.
+    Given the file name to compile it under, the .pyc is reproducible
+    too: it has a hash-based header and does not depend on where the
+    source is.
+    """
+    with open(path, 'rb') as f:
+        source = f.read()
+    code = compile(source, filename or path, 'exec', dont_inherit=True, optimize=optimize)
+    if filename:
+        # Unchecked, as zipimport refuses checked hash-based .pyc files
+        header = importlib.util.MAGIC_NUMBER + struct.pack('<I', 0b01) + importlib.util.source_hash(source)
+        return header + canonical_marshal(marshal.dumps(code))
+    st = os.stat(path)
+    header = importlib.util.MAGIC_NUMBER + struct.pack('<III', 0, int(st.st_mtime) & 0xFFFFFFFF,
+                                                       st.st_size & 0xFFFFFFFF)
+    return header + canonical_marshal(marshal.dumps(code))
+
+
+def source_filename(member):
+    """File name a module of a deterministic build is compiled under"""
+    return member[:-len('.pyc')] + '.py'
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def same_content(a, b):
+    return os.path.getsize(a) == os.path.getsize(b) and file_digest(a) == file_digest(b)
+
+
+def deploy_file(src, dst):
+    """
+    Copy src to dst unless dst already has the same content.  The copy
+    is written next to dst and renamed over it, so the game never sees
+    dst half written.  Returns True if dst was replaced.
+    """
+    if os.path.isfile(dst) and same_content(src, dst):
+        return False
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = dst + '.tmp'
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+    return True
+
+
+def sync_folder(src, dst):
+    """
+    Make dst a copy of src, leaving __pycache__ folders alone: only files
+    that differ are deployed, and files and folders no longer in src are
+    removed.  Returns the number of files copied and of entries removed.
+    """
+    copied = removed = 0
+    for folder, subs, files in os.walk(src):
+        subs[:] = [sub for sub in subs if sub != '__pycache__']
+        rel = os.path.relpath(folder, src)
+        for filename in files:
+            if deploy_file(os.path.join(folder, filename), os.path.normpath(os.path.join(dst, rel, filename))):
+                copied += 1
+    for folder, subs, files in os.walk(dst):
+        rel = os.path.relpath(folder, dst)
+        for sub in list(subs):
+            if sub == '__pycache__' or not os.path.isdir(os.path.join(src, rel, sub)):
+                subs.remove(sub)
+                if sub != '__pycache__':
+                    shutil.rmtree(os.path.join(folder, sub))
+                    removed += 1
+        for filename in files:
+            if not os.path.isfile(os.path.join(src, rel, filename)):
+                os.remove(os.path.join(folder, filename))
+                removed += 1
+    return copied, removed
+
+
+class BuildManifest:
+    """
+    Hash of the source of every module of a mod's last build, next to
+    the compiled .pyc kept for it in the build folder, plus the digest of
+    the archive written from them.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, 'manifest.json')
+        self.modules = {}
+        self.archive = None
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                manifest = json.load(f)
+            self.modules = manifest['modules']
+            self.archive = manifest['archive']
+
+    def blob_path(self, member):
+        return os.path.join(self.folder, 'pyc', *member.split('/'))
+
+    def is_current(self, member, digest):
+        return self.modules.get(member) == digest and os.path.isfile(self.blob_path(member))
+
+    def store(self, member, digest, pyc):
+        path = self.blob_path(member)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(pyc)
+        os.replace(tmp, path)
+        self.modules[member] = digest
+
+    def remove(self, member):
+        del self.modules[member]
+        if os.path.isfile(self.blob_path(member)):
+            os.remove(self.blob_path(member))
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'modules': self.modules, 'archive': self.archive}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def compile_modules(stale, optimize, workers=None, deterministic=False):
+    """
+    Yield the .pyc of each (member, path) in stale, in order.  Several
+    modules are compiled in a process pool; as compile_source writes
+    canonical marshal data, this gives the same bytes as compiling them
+    here.
+    """
+    if workers is None:
+        # Imported here, as the Utilities package imports this module
+        from Utilities import default_workers
+        workers = default_workers()
+    paths = [path for member, path in stale]
+    filenames = [source_filename(member) if deterministic else None for member, path in stale]
+    if workers <= 1 or len(stale) < 2:
+        for path, filename in zip(paths, filenames):
+            yield compile_source(path, optimize, filename)
+        return
+    # Each worker re-imports this module, so scripts building in a pool
+    # must be guarded by "if __name__ == '__main__'" for the spawn start
+    # method
+    workers = min(workers, len(stale))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(paths) // (workers * 4))
+        yield from executor.map(compile_source, paths, repeat(optimize), filenames, chunksize=chunksize)
+
+
+def write_archive(ts4script, manifest, modules, results, stale, deterministic=False):
+    """
+    Write every (member, path) in modules to ts4script in order.  The
+    .pyc of the members in stale are taken from results as they come
+    in, in the same order, and stored with their digest in the
+    manifest; the others are read from the build folder.  Members of a
+    deterministic archive get a fixed timestamp and creator system.
+    """
+    tmp = ts4script + '.tmp'
+    try:
+        with ZipFile(tmp, 'w', compression=ZIP_STORED, allowZip64=True) as zf:
+            for member, path in modules:
+                if member in stale:
+                    pyc = next(results)
+                    manifest.store(member, stale[member], pyc)
+                else:
+                    with open(manifest.blob_path(member), 'rb') as f:
+                        pyc = f.read()
+                if deterministic:
+                    info = ZipInfo(member, deterministic_date_time)
+                    info.create_system = 0
+                else:
+                    info = ZipInfo(member, time.localtime(os.path.getmtime(path))[:6])
+                info.compress_type = ZIP_STORED
+                info.external_attr = 0o644 << 16
+                zf.writestr(info, pyc)
+    except BaseException:
+        # A module that does not compile leaves the last archive in place
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, ts4script)
+
+
+def build_archive(src, ts4script, build_folder, optimize=2, workers=None, deterministic=False):
+    """
+    Incrementally build ts4script from the modules under src: only
+    modules whose source changed since the last build are recompiled,
+    in a process pool of workers processes when there are several, and
+    the archive is only rewritten if a module was added, removed or
+    recompiled, or the archive itself no longer matches the last build.
+    A deterministic build gives the same archive bytes for the same
+    sources, wherever, whenever and in whichever process it is built.
+    Returns True if the archive was rewritten.
+    """
+    os.makedirs(build_folder, exist_ok=True)
+    manifest = BuildManifest(build_folder)
+    modules = find_modules(src)
+    stale = {}
+    for member, path in modules:
+        with open(path, 'rb') as f:
+            digest = source_hash(f.read(), optimize, source_filename(member) if deterministic else path)
+        if not manifest.is_current(member, digest):
+            stale[member] = digest
+    members = set(member for member, path in modules)
+    removed = [member for member in manifest.modules if member not in members]
+    for member in removed:
+        manifest.remove(member)
+    if not stale and not removed and os.path.isfile(ts4script) and file_digest(ts4script) == manifest.archive:
+        return False
+    results = compile_modules([(member, path) for member, path in modules if member in stale],
+                              optimize, workers, deterministic)
+    write_archive(ts4script, manifest, modules, results, stale, deterministic)
+    manifest.archive = file_digest(ts4script)
+    manifest.save()
+    return True
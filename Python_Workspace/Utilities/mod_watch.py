@@ -0,0 +1,158 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+watch_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+event_header = struct.Struct('iIII')
+
+
+def is_source_change(path):
+    # Bytecode the interpreter or an old writepy build leaves next to
+    # the sources is not a change
+    return '__pycache__' not in path.split(os.sep) and not path.endswith('.pyc')
+
+
+class PollingWatcher:
+    """
+    Notices changes under folders by comparing the mtime and size of
+    their files every interval seconds.
+    """
+
+    def __init__(self, folders, interval=0.5):
+        self.folders = folders
+        self.interval = interval
+        self.snapshots = {folder: self.snapshot(folder) for folder in folders}
+
+    def snapshot(self, folder):
+        files = {}
+        for path, subs, filenames in os.walk(folder):
+            subs[:] = [sub for sub in subs if sub != '__pycache__']
+            for filename in filenames:
+                filename = os.path.join(path, filename)
+                if is_source_change(filename):
+                    try:
+                        st = os.stat(filename)
+                    except OSError:
+                        continue
+                    files[filename] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def wait(self, timeout=None):
+        """Return the folders that changed, or an empty set after timeout seconds"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self.interval if deadline is None else min(self.interval, max(0, deadline - time.monotonic()))
+            time.sleep(delay)
+            changed = set()
+            for folder in self.folders:
+                snapshot = self.snapshot(folder)
+                if snapshot != self.snapshots[folder]:
+                    self.snapshots[folder] = snapshot
+                    changed.add(folder)
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Notices changes under folders through Linux inotify, watching every
+    folder below them as inotify watches are not recursive.
+    """
+
+    def __init__(self, folders):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.folders = folders
+        # Watch descriptor: (watched folder it is under, path)
+        self.watches = {}
+        for folder in folders:
+            self.add_tree(folder, folder)
+
+    def add_tree(self, folder, path):
+        for path, subs, filenames in os.walk(path):
+            subs[:] = [sub for sub in subs if sub != '__pycache__']
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), watch_mask)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                if not os.path.isdir(path):
+                    # Already removed again within the same burst of edits
+                    continue
+                raise OSError(errno, 'inotify_add_watch failed for {}: {}'.format(path, os.strerror(errno)))
+            self.watches[wd] = (folder, path)
+
+    def wait(self, timeout=None):
+        """Return the folders that changed, or an empty set after timeout seconds"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        changed = set()
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = event_header.unpack_from(data, pos)
+            name = os.fsdecode(data[pos + event_header.size:pos + event_header.size + length].rstrip(b'\0'))
+            pos += event_header.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, so anything may have changed
+                changed.update(self.folders)
+                continue
+            if wd not in self.watches:
+                continue
+            folder, path = self.watches[wd]
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+            path = os.path.join(path, name)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and name != '__pycache__':
+                self.add_tree(folder, path)
+            if is_source_change(path):
+                changed.add(folder)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(folders, poll=False, interval=0.5):
+    """An InotifyWatcher where available, else a PollingWatcher"""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(folders)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(folders, interval)
+
+
+def watch(watcher, build, debounce=0.3):
+    """
+    Call build(folder) for every folder that changed, once its burst of
+    changes has been quiet for debounce seconds.
+    """
+    while True:
+        changed = watcher.wait()
+        while changed:
+            more = watcher.wait(debounce)
+            if not more:
+                break
+            changed |= more
+        for folder in sorted(changed):
+            build(folder)
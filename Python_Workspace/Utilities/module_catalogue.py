@@ -0,0 +1,101 @@
+import json
+import os
+from collections import OrderedDict
+from zipfile import PyZipFile
+
+
+def module_name(member):
+    parts = member[:-len('.pyc')].split('/')
+    if parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts)
+
+
+class ModuleCatalogue:
+    """
+    Archive, member name, size and CRC of every .pyc in the game
+    archives, by module name.  Reading it only touches the archives'
+    central directories, so nothing has to be decompressed or
+    decompiled until a module is asked for.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.modules = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.modules = json.load(f)
+
+    @classmethod
+    def for_folder(cls, ea_folder):
+        ea_folder = os.path.abspath(ea_folder)
+        return cls(ea_folder + '.catalogue.json')
+
+    def add_archive(self, src):
+        src = os.path.abspath(src)
+        with PyZipFile(src) as zip:
+            for info in zip.infolist():
+                if info.filename.endswith('.pyc'):
+                    self.modules[module_name(info.filename)] = [src, info.filename, info.file_size, info.CRC]
+
+    def find(self, module):
+        try:
+            return self.modules[module]
+        except KeyError:
+            raise LookupError("Module {} is not in any catalogued archive".format(module)) from None
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.modules, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+class LazyDecompiler:
+    """
+    Decompiles a catalogued module the first time it is asked for,
+    writing it to the same place in ea_folder as a full extraction
+    would.  Sources are kept in memory for the max_modules most recently
+    used modules, and on disk in cache for every module ever decompiled.
+    """
+
+    def __init__(self, ea_folder, catalogue, cache, max_modules=64):
+        self.ea_folder = ea_folder
+        self.catalogue = catalogue
+        self.cache = cache
+        self.max_modules = max_modules
+        self.sources = OrderedDict()
+
+    def py_path(self, src, member):
+        out_folder = os.path.join(self.ea_folder, os.path.splitext(os.path.basename(src))[0])
+        return os.path.join(out_folder, *member[:-len('.pyc')].split('/')) + '.py'
+
+    def read(self, module):
+        src, member, size, crc = self.catalogue.find(module)
+        with PyZipFile(src) as zip:
+            return zip.read(member)
+
+    def source(self, module):
+        entry = tuple(self.catalogue.find(module))
+        if entry in self.sources:
+            self.sources.move_to_end(entry)
+            return self.sources[entry]
+        # Deferred, as Utilities imports this module
+        from Utilities import decompile_to_file
+        src, member, size, crc = entry
+        data = self.read(module)
+        py_path = self.py_path(src, member)
+        os.makedirs(os.path.dirname(py_path), exist_ok=True)
+        key = self.cache.key(data)
+        if not self.cache.fetch(key, py_path):
+            result = decompile_to_file(src + '/' + member, data, py_path)
+            if result['status'] != 'ok':
+                raise RuntimeError("Failed to decompile {}: {}: {}".format(
+                    module, result['error_type'], result['error']))
+            self.cache.store(key, py_path)
+        with open(py_path, 'r') as f:
+            text = f.read()
+        self.sources[entry] = text
+        if len(self.sources) > self.max_modules:
+            self.sources.popitem(last=False)
+        return text
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import sqlite3
+
+from Utilities.decompile_cache import decompiler_version
+from Utilities.unpyc3 import AssignStatement, ClassStatement, PyName
+
+schema = """
+CREATE TABLE IF NOT EXISTS folders (path TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS modules (path TEXT PRIMARY KEY, module TEXT, digest TEXT);
+CREATE TABLE IF NOT EXISTS symbols (path TEXT, qualname TEXT, name TEXT, kind TEXT, line INTEGER);
+CREATE TABLE IF NOT EXISTS bases (path TEXT, qualname TEXT, line INTEGER, base TEXT, base_name TEXT);
+CREATE TABLE IF NOT EXISTS refs (path TEXT, qualname TEXT, kind TEXT, line INTEGER, name TEXT);
+CREATE INDEX IF NOT EXISTS symbols_path ON symbols (path);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name);
+CREATE INDEX IF NOT EXISTS symbols_qualname ON symbols (qualname);
+CREATE INDEX IF NOT EXISTS bases_path ON bases (path);
+CREATE INDEX IF NOT EXISTS bases_base_name ON bases (base_name);
+CREATE INDEX IF NOT EXISTS refs_path ON refs (path);
+CREATE INDEX IF NOT EXISTS refs_name ON refs (name);
+"""
+
+
+def last_name(name):
+    return name.rsplit('.', 1)[-1]
+
+
+class SymbolCollector:
+    """
+    Records the classes, functions and constants of one module as
+    IndentStream displays them, so indexing costs no extra decompile.
+    Each symbol is a (qualname, kind, line, bases, refs) tuple.
+    """
+
+    def __init__(self):
+        self.symbols = []
+        # (indent level, qualname, kind) of the enclosing definitions
+        self.scopes = []
+        # Lines written by the statements before the current one
+        self.line = 0
+
+    def define(self, stmt, level, line):
+        while self.scopes and self.scopes[-1][0] >= level:
+            self.scopes.pop()
+        parent = self.scopes[-1] if self.scopes else None
+        line += self.line
+        if isinstance(stmt, AssignStatement):
+            # Only module and class level names are worth indexing
+            if parent is None or parent[2] == 'class':
+                for target in stmt.chain[:-1]:
+                    if isinstance(target, PyName):
+                        self.add(parent, str(target), 'constant', line, [], [])
+            return
+        if isinstance(stmt, ClassStatement):
+            qualname = self.add(parent, str(stmt.name), 'class', line,
+                                [str(base) for base in stmt.parents], stmt.func.code.code_obj.co_names)
+            self.scopes.append((level, qualname, 'class'))
+        else:
+            qualname = self.add(parent, stmt.code.name, 'def', line, [], stmt.code.code_obj.co_names)
+            self.scopes.append((level, qualname, 'def'))
+
+    def add(self, parent, name, kind, line, bases, refs):
+        if parent is None:
+            qualname = name
+        elif parent[2] == 'class':
+            qualname = parent[1] + '.' + name
+        else:
+            qualname = parent[1] + '.<locals>.' + name
+        self.symbols.append((qualname, kind, line, bases, sorted(set(refs))))
+        return qualname
+
+
+class SymbolIndex:
+    """
+    SQLite index of the classes, functions and constants of every module
+    decompiled into an EA folder: where each is defined, its base classes
+    and the global and attribute names its body refers to.  Modules are
+    keyed by their .py path under root and re-indexed only when their
+    .pyc (or unpyc3) changes.
+    """
+
+    def __init__(self, path, root):
+        self.path = path
+        self.root = root
+        self.version = decompiler_version().encode()
+        self.db = sqlite3.connect(path)
+        self.db.executescript(schema)
+
+    @classmethod
+    def for_folder(cls, ea_folder):
+        ea_folder = os.path.abspath(ea_folder)
+        return cls(ea_folder + '.symbols.db', ea_folder)
+
+    def digest(self, data):
+        h = hashlib.sha256(self.version)
+        h.update(data)
+        return h.hexdigest()
+
+    def relpath(self, py_path):
+        return os.path.relpath(py_path, self.root).replace(os.sep, '/')
+
+    def module_name(self, py_path):
+        # The first folder under an EA folder is the archive the module
+        # was extracted from, e.g. EA/simulation/objects/components/...
+        parts = self.relpath(py_path)[:-len('.py')].split('/')[1:]
+        if parts and parts[-1] == '__init__':
+            parts.pop()
+        return '.'.join(parts)
+
+    def add_folder(self, folder):
+        """Record that every module extracted to folder has been indexed"""
+        self.db.execute("INSERT OR IGNORE INTO folders VALUES (?)", (self.relpath(folder),))
+
+    def has_folder(self, folder):
+        # Indexes made before folders were recorded only have modules
+        path = self.relpath(folder)
+        prefix = path + '/'
+        return self.db.execute("SELECT 1 FROM folders WHERE path = ?", (path,)).fetchone() is not None or \
+            self.db.execute("SELECT 1 FROM modules WHERE substr(path, 1, ?) = ? LIMIT 1",
+                            (len(prefix), prefix)).fetchone() is not None
+
+    def is_current(self, py_path, digest):
+        row = self.db.execute("SELECT digest FROM modules WHERE path = ?",
+                              (self.relpath(py_path),)).fetchone()
+        return row is not None and row[0] == digest
+
+    def remove(self, py_path):
+        path = self.relpath(py_path)
+        for table in ('modules', 'symbols', 'bases', 'refs'):
+            self.db.execute("DELETE FROM %s WHERE path = ?" % table, (path,))
+
+    def update(self, py_path, digest, symbols):
+        self.remove(py_path)
+        path = self.relpath(py_path)
+        self.db.execute("INSERT INTO modules VALUES (?, ?, ?)", (path, self.module_name(py_path), digest))
+        self.db.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?)",
+                            [(path, qualname, last_name(qualname), kind, line)
+                             for qualname, kind, line, bases, refs in symbols])
+        self.db.executemany("INSERT INTO bases VALUES (?, ?, ?, ?, ?)",
+                            [(path, qualname, line, base, last_name(base))
+                             for qualname, kind, line, bases, refs in symbols for base in bases])
+        self.db.executemany("INSERT INTO refs VALUES (?, ?, ?, ?, ?)",
+                            [(path, qualname, kind, line, name)
+                             for qualname, kind, line, bases, refs in symbols for name in refs])
+
+    def save(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def defined(self, name):
+        """Definitions of name, given as a plain, qualified or module.qualified name"""
+        return self.db.execute(
+            "SELECT m.module, s.qualname, s.kind, m.path, s.line FROM symbols s JOIN modules m USING (path) "
+            "WHERE s.name = ? AND (s.qualname = ? OR s.name = ? OR m.module || '.' || s.qualname = ?) "
+            "ORDER BY m.module, s.line", (last_name(name), name, name, name)).fetchall()
+
+    def subclasses(self, name):
+        """Classes listing name among their bases"""
+        return self.db.execute(
+            "SELECT m.module, b.qualname, b.base, m.path, b.line FROM bases b JOIN modules m USING (path) "
+            "WHERE b.base_name = ? ORDER BY m.module, b.line", (last_name(name),)).fetchall()
+
+    def callers(self, name):
+        """Classes and functions whose body refers to name"""
+        return self.db.execute(
+            "SELECT m.module, r.qualname, r.kind, m.path, r.line FROM refs r JOIN modules m USING (path) "
+            "WHERE r.name = ? ORDER BY m.module, r.line", (last_name(name),)).fetchall()
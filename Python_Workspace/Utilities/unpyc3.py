@@ -39,7 +39,7 @@ def get_trace():
 
 def trace(*args):
     global current_trace
-    if current_trace:
+    if current_trace is not _trace:
         current_trace(*args)
 
 
@@ -54,14 +54,79 @@ current_trace = _trace
 # - Handle assert statements better
 # - (Partly done) Nice spacing between function/class declarations
 
-import dis
 from array import array
-from opcode import opname, opmap, HAVE_ARGUMENT, cmp_op
+from bisect import bisect_left, bisect_right, insort
 import inspect
 
+from itertools import repeat
+from operator import is_
 import struct
 import sys
 
+# The bytecode unpyc3 decompiles.  Its opcode table is bundled below
+# rather than taken from the opcode module, so that 3.7 bytecode
+# decompiles the same whatever version of Python runs unpyc3
+target_version = (3, 7)
+
+opmap = {
+    'POP_TOP': 1, 'ROT_TWO': 2, 'ROT_THREE': 3, 'DUP_TOP': 4, 'DUP_TOP_TWO': 5,
+    'NOP': 9, 'UNARY_POSITIVE': 10, 'UNARY_NEGATIVE': 11, 'UNARY_NOT': 12,
+    'UNARY_INVERT': 15, 'BINARY_MATRIX_MULTIPLY': 16,
+    'INPLACE_MATRIX_MULTIPLY': 17, 'BINARY_POWER': 19, 'BINARY_MULTIPLY': 20,
+    'BINARY_MODULO': 22, 'BINARY_ADD': 23, 'BINARY_SUBTRACT': 24,
+    'BINARY_SUBSCR': 25, 'BINARY_FLOOR_DIVIDE': 26, 'BINARY_TRUE_DIVIDE': 27,
+    'INPLACE_FLOOR_DIVIDE': 28, 'INPLACE_TRUE_DIVIDE': 29, 'GET_AITER': 50,
+    'GET_ANEXT': 51, 'BEFORE_ASYNC_WITH': 52, 'INPLACE_ADD': 55,
+    'INPLACE_SUBTRACT': 56, 'INPLACE_MULTIPLY': 57, 'INPLACE_MODULO': 59,
+    'STORE_SUBSCR': 60, 'DELETE_SUBSCR': 61, 'BINARY_LSHIFT': 62,
+    'BINARY_RSHIFT': 63, 'BINARY_AND': 64, 'BINARY_XOR': 65, 'BINARY_OR': 66,
+    'INPLACE_POWER': 67, 'GET_ITER': 68, 'GET_YIELD_FROM_ITER': 69,
+    'PRINT_EXPR': 70, 'LOAD_BUILD_CLASS': 71, 'YIELD_FROM': 72,
+    'GET_AWAITABLE': 73, 'INPLACE_LSHIFT': 75, 'INPLACE_RSHIFT': 76,
+    'INPLACE_AND': 77, 'INPLACE_XOR': 78, 'INPLACE_OR': 79, 'BREAK_LOOP': 80,
+    'WITH_CLEANUP_START': 81, 'WITH_CLEANUP_FINISH': 82, 'RETURN_VALUE': 83,
+    'IMPORT_STAR': 84, 'SETUP_ANNOTATIONS': 85, 'YIELD_VALUE': 86,
+    'POP_BLOCK': 87, 'END_FINALLY': 88, 'POP_EXCEPT': 89, 'STORE_NAME': 90,
+    'DELETE_NAME': 91, 'UNPACK_SEQUENCE': 92, 'FOR_ITER': 93, 'UNPACK_EX': 94,
+    'STORE_ATTR': 95, 'DELETE_ATTR': 96, 'STORE_GLOBAL': 97,
+    'DELETE_GLOBAL': 98, 'LOAD_CONST': 100, 'LOAD_NAME': 101,
+    'BUILD_TUPLE': 102, 'BUILD_LIST': 103, 'BUILD_SET': 104, 'BUILD_MAP': 105,
+    'LOAD_ATTR': 106, 'COMPARE_OP': 107, 'IMPORT_NAME': 108,
+    'IMPORT_FROM': 109, 'JUMP_FORWARD': 110, 'JUMP_IF_FALSE_OR_POP': 111,
+    'JUMP_IF_TRUE_OR_POP': 112, 'JUMP_ABSOLUTE': 113, 'POP_JUMP_IF_FALSE': 114,
+    'POP_JUMP_IF_TRUE': 115, 'LOAD_GLOBAL': 116, 'CONTINUE_LOOP': 119,
+    'SETUP_LOOP': 120, 'SETUP_EXCEPT': 121, 'SETUP_FINALLY': 122,
+    'LOAD_FAST': 124, 'STORE_FAST': 125, 'DELETE_FAST': 126,
+    'RAISE_VARARGS': 130, 'CALL_FUNCTION': 131, 'MAKE_FUNCTION': 132,
+    'BUILD_SLICE': 133, 'LOAD_CLOSURE': 135, 'LOAD_DEREF': 136,
+    'STORE_DEREF': 137, 'DELETE_DEREF': 138, 'CALL_FUNCTION_KW': 141,
+    'CALL_FUNCTION_EX': 142, 'SETUP_WITH': 143, 'EXTENDED_ARG': 144,
+    'LIST_APPEND': 145, 'SET_ADD': 146, 'MAP_ADD': 147, 'LOAD_CLASSDEREF': 148,
+    'BUILD_LIST_UNPACK': 149, 'BUILD_MAP_UNPACK': 150,
+    'BUILD_MAP_UNPACK_WITH_CALL': 151, 'BUILD_TUPLE_UNPACK': 152,
+    'BUILD_SET_UNPACK': 153, 'SETUP_ASYNC_WITH': 154, 'FORMAT_VALUE': 155,
+    'BUILD_CONST_KEY_MAP': 156, 'BUILD_STRING': 157,
+    'BUILD_TUPLE_UNPACK_WITH_CALL': 158, 'LOAD_METHOD': 160,
+    'CALL_METHOD': 161,
+}
+
+opname = ['<%r>' % (op,) for op in range(256)]
+for name, val in opmap.items():
+    opname[val] = name
+
+HAVE_ARGUMENT = 90
+
+cmp_op = ('<', '<=', '==', '!=', '>', '>=', 'in', 'not in', 'is', 'is not',
+          'exception match', 'BAD')
+
+hasjrel = [93, 110, 120, 121, 122, 143, 154]
+hasjabs = [111, 112, 113, 114, 115, 119]
+
+# Magic numbers of 3.7 bytecode and their header layout: 3392 introduced
+# the PEP 552 header and 3394 is 3.7.0 final
+target_magics = {3392: 'pep552', 3393: 'pep552', 3394: 'pep552'}
+target_magic = (3394).to_bytes(2, 'little') + b'\r\n'
+
 # Masks for code object's co_flag attribute
 VARARGS = 4
 VARKEYWORDS = 8
@@ -106,36 +171,227 @@ for_jump_opcodes = (
     GET_ITER, FOR_ITER, GET_ANEXT
 )
 
+# The instructions that stop the forward and backward scans of
+# SuiteDecompiler.is_for_loop, scan_to_first_jump_if and
+# scan_for_final_jump
+for_loop_scan_opcodes = else_jump_opcodes + for_jump_opcodes
+first_jump_if_scan_opcodes = pop_jump_if_opcodes + else_jump_opcodes + for_jump_opcodes
+final_jump_scan_opcodes = else_jump_opcodes + pop_jump_if_opcodes
 
-def read_code(stream):
-    # This helper is needed in order for the PEP 302 emulation to 
-    # correctly handle compiled files
-    # Note: stream must be opened in "rb" mode
+
+class PycHeaderError(ValueError):
+    """
+    The header of a .pyc could not be parsed.  reason is a short tag
+    ('truncated', 'magic' or 'flags'); magic is the magic number found
+    and expected that of the bytecode unpyc3 decompiles, if relevant.
+    """
+
+    def __init__(self, reason, message, magic=None, expected=None):
+        ValueError.__init__(self, message)
+        self.reason = reason
+        self.magic = magic
+        self.expected = expected
+
+
+class MarshalCode:
+    """
+    A 3.7 code object read by load_marshal, with the co_* attributes
+    unpyc3 uses, for when the host's own code objects are different
+    """
+
+    __slots__ = ('co_argcount', 'co_kwonlyargcount', 'co_nlocals', 'co_stacksize', 'co_flags',
+                 'co_code', 'co_consts', 'co_names', 'co_varnames', 'co_freevars', 'co_cellvars',
+                 'co_filename', 'co_name', 'co_firstlineno', 'co_lnotab')
+
+    def __repr__(self):
+        return '<code object {} at {:#x}, file "{}", line {}>'.format(
+            self.co_name, id(self), self.co_filename, self.co_firstlineno)
+
+
+def iscode(obj):
+    return inspect.iscode(obj) or isinstance(obj, MarshalCode)
+
+
+class MarshalReader:
+    """
+    Pure Python reader of 3.7 marshal data, used when the host
+    interpreter's marshal format is not 3.7's.  Values are built exactly
+    as marshal.loads would, except that code objects are MarshalCode.
+    """
+
+    # Terminates the items of a dict
+    null = object()
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+        self.refs = []
+
+    def r_byte(self):
+        b = self.data[self.pos]
+        self.pos += 1
+        return b
+
+    def r_long(self):
+        value = struct.unpack_from('<i', self.data, self.pos)[0]
+        self.pos += 4
+        return value
+
+    def r_bytes(self, n):
+        start = self.pos
+        self.pos += n
+        if self.pos > len(self.data):
+            raise EOFError("EOF read where object expected")
+        return bytes(self.data[start:self.pos])
+
+    def r_float_str(self):
+        return float(self.r_bytes(self.r_byte()).decode('ascii'))
+
+    def r_double(self):
+        value = struct.unpack_from('<d', self.data, self.pos)[0]
+        self.pos += 8
+        return value
+
+    def r_object(self):
+        code = self.r_byte()
+        kind = chr(code & 0x7f)
+        if kind == 'r':
+            return self.refs[self.r_long()]
+        try:
+            read = self.readers[kind]
+        except KeyError:
+            raise ValueError("bad marshal data (unknown type code)") from None
+        if code & 0x80:
+            # Containers are registered before their items are read, as
+            # marshal does, so references keep their numbering
+            index = len(self.refs)
+            self.refs.append(None)
+            value = self.refs[index] = read(self)
+            return value
+        return read(self)
+
+    def r_long_int(self):
+        n = self.r_long()
+        value = 0
+        for i in range(abs(n)):
+            value |= struct.unpack_from('<H', self.data, self.pos + 2 * i)[0] << (15 * i)
+        self.pos += 2 * abs(n)
+        return -value if n < 0 else value
+
+    def r_dict(self):
+        d = {}
+        while True:
+            key = self.r_object()
+            if key is self.null:
+                return d
+            d[key] = self.r_object()
+
+    def r_code(self):
+        code = MarshalCode()
+        code.co_argcount = self.r_long()
+        code.co_kwonlyargcount = self.r_long()
+        code.co_nlocals = self.r_long()
+        code.co_stacksize = self.r_long()
+        code.co_flags = self.r_long()
+        code.co_code = self.r_object()
+        code.co_consts = self.r_object()
+        code.co_names = self.r_object()
+        code.co_varnames = self.r_object()
+        code.co_freevars = self.r_object()
+        code.co_cellvars = self.r_object()
+        code.co_filename = self.r_object()
+        code.co_name = self.r_object()
+        code.co_firstlineno = self.r_long()
+        code.co_lnotab = self.r_object()
+        return code
+
+    readers = {
+        '0': lambda self: self.null,
+        'N': lambda self: None,
+        'F': lambda self: False,
+        'T': lambda self: True,
+        'S': lambda self: StopIteration,
+        '.': lambda self: Ellipsis,
+        'i': r_long,
+        'l': r_long_int,
+        'f': r_float_str,
+        'g': r_double,
+        'x': lambda self: complex(self.r_float_str(), self.r_float_str()),
+        'y': lambda self: complex(self.r_double(), self.r_double()),
+        's': lambda self: self.r_bytes(self.r_long()),
+        't': lambda self: self.r_bytes(self.r_long()).decode('utf8', 'surrogatepass'),
+        'u': lambda self: self.r_bytes(self.r_long()).decode('utf8', 'surrogatepass'),
+        'a': lambda self: self.r_bytes(self.r_long()).decode('ascii'),
+        'A': lambda self: self.r_bytes(self.r_long()).decode('ascii'),
+        'z': lambda self: self.r_bytes(self.r_byte()).decode('ascii'),
+        'Z': lambda self: self.r_bytes(self.r_byte()).decode('ascii'),
+        '(': lambda self: tuple([self.r_object() for i in range(self.r_long())]),
+        ')': lambda self: tuple([self.r_object() for i in range(self.r_byte())]),
+        '[': lambda self: [self.r_object() for i in range(self.r_long())],
+        '{': r_dict,
+        '<': lambda self: {self.r_object() for i in range(self.r_long())},
+        '>': lambda self: frozenset([self.r_object() for i in range(self.r_long())]),
+        'c': r_code,
+    }
+
+
+def load_marshal(data, magic=None):
+    """
+    Unmarshal 3.7 data, with the host marshal module if the host writes
+    the same bytecode (magic is the .pyc's, if known), else with
+    MarshalReader
+    """
+    import importlib.util
     import marshal
 
-    if sys.version_info < (3, 4):
-        import imp
-        runtime_magic = imp.get_magic()
-    else:
-        import importlib.util
-        runtime_magic = importlib.util.MAGIC_NUMBER
+    host_magic = importlib.util.MAGIC_NUMBER
+    if host_magic == magic or (magic is None and host_magic[:2] in [
+            m.to_bytes(2, 'little') for m in target_magics]):
+        return marshal.loads(data)
+    return MarshalReader(data).r_object()
 
-    magic = stream.read(4)
-    if magic != runtime_magic:
-        print("*** Warning: file has wrong magic number ***")
 
-    flags = 0
-    if sys.version_info >= (3, 7):
-        flags = struct.unpack('i', stream.read(4))[0]
+# Header size of each .pyc layout: 'pep552' is magic, flags and then
+# either timestamp and source size or a source hash (3.7+), 'legacy' is
+# magic, timestamp and source size (3.3 - 3.6) and 'raw' is bare marshal
+# data with no header at all
+pyc_header_sizes = {'pep552': 16, 'legacy': 12, 'raw': 0}
 
-    if flags & 1:
-        stream.read(4)
-        stream.read(4)
-    else:
-        stream.read(4)  # Skip timestamp
-        if sys.version_info >= (3, 3):
-            stream.read(4)  # Skip rawsize
-            return marshal.load(stream)
+
+def read_pyc(data, header=None):
+    """
+    Return the module code object of a .pyc given as bytes, bytearray or
+    memoryview, without copying it.  header is one of pyc_header_sizes;
+    by default it is chosen from the magic number, which must be that of
+    3.7 bytecode.
+    """
+    view = memoryview(data)
+    magic = None
+    if header is None:
+        if len(view) < 4:
+            raise PycHeaderError('truncated', "Truncated .pyc header: {} of 4 bytes".format(len(view)))
+        magic = bytes(view[:4])
+        header = target_magics.get(int.from_bytes(magic[:2], 'little')) if magic[2:] == b'\r\n' else None
+        if header is None:
+            raise PycHeaderError('magic', "Bad magic number {} (expected Python {}.{} bytecode, {})".format(
+                magic.hex(), target_version[0], target_version[1], target_magic.hex()), magic, target_magic)
+    size = pyc_header_sizes[header]
+    if len(view) < size:
+        raise PycHeaderError('truncated', "Truncated .pyc header: {} of {} bytes".format(len(view), size))
+    if header != 'raw':
+        magic = bytes(view[:4])
+        if header == 'pep552':
+            # Bit 0: hash based, bit 1: check_source; both layouts are
+            # 16 bytes long
+            flags = struct.unpack_from('<I', view, 4)[0]
+            if flags & ~0x3:
+                raise PycHeaderError('flags', "Invalid .pyc flags {:#x}".format(flags), magic, target_magic)
+    return load_marshal(view[size:], magic)
+
+
+def read_code(stream):
+    # Note: stream must be opened in "rb" mode
+    return read_pyc(stream.read())
 
 
 def dec_module(path):
@@ -149,20 +405,57 @@ def dec_module(path):
     elif not path.endswith(".pyc") and not path.endswith(".pyo"):
         raise ValueError("path must point to a .py or .pyc file")
     with open(path, "rb") as stream:
-        code_obj = read_code(stream)
-        code = Code(code_obj)
-        return code.get_suite(include_declarations=False, look_for_docstring=True)
+        return dec_stream(stream)
+
+
+def dec_stream(stream):
+    return dec_module_code(read_code(stream))
+
+
+def dec_pyc(data, header=None):
+    return dec_module_code(read_pyc(data, header))
+
+
+def dec_module_code(code_obj):
+    code = Code(code_obj)
+    return code.get_suite(include_declarations=False, look_for_docstring=True)
+
+
+def count_instructions(code_obj):
+    """Number of instructions in code_obj and all code nested in it"""
+    count = len(code_obj.co_code) // 2
+    for const in code_obj.co_consts:
+        if iscode(const):
+            count += count_instructions(const)
+    return count
 
 
-def decompile(obj):
+def decompile(obj, symbols=None):
     """
     Decompile obj if it is a module object, a function or a
     code object. If obj is a string, it is assumed to be the path
-    to a python module.
+    to a python module. If obj is bytes, it is assumed to be the
+    contents of a .pyc file.
+
+    symbols, if given, is a list of dotted names such as
+    'InventoryComponent.push_items_to_household_inventory'; only those
+    classes and functions of the module are decompiled.
     """
+    if symbols is not None:
+        if isinstance(obj, str):
+            suite = dec_module(obj)
+        elif isinstance(obj, (bytes, bytearray, memoryview)):
+            suite = dec_pyc(obj)
+        elif inspect.ismodule(obj):
+            suite = dec_module(obj.__file__)
+        else:
+            raise TypeError("symbols can only be selected from a module")
+        return select_symbols(suite, symbols)
     if isinstance(obj, str):
         return dec_module(obj)
-    if inspect.iscode(obj):
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return dec_pyc(obj)
+    if iscode(obj):
         code = Code(obj)
         return code.get_suite()
     if inspect.isfunction(obj):
@@ -177,6 +470,36 @@ def decompile(obj):
         raise TypeError(msg)
 
 
+def find_symbol(suite, symbol):
+    """
+    Return the last class or def statement called symbol in suite.
+    Function bodies are only decompiled when displayed, so looking up
+    a dotted name only runs the module body and the bodies of the
+    classes and functions on the way to it.
+    """
+    stmt = None
+    for name in symbol.split('.'):
+        if name == '<locals>':
+            continue
+        if isinstance(stmt, ClassStatement):
+            suite = stmt.func.code.get_suite(look_for_docstring=True)
+        elif stmt is not None:
+            suite = stmt.code.get_suite()
+        matches = [s for s in suite.statements
+                   if isinstance(s, (ClassStatement, DefStatement)) and str(s.name) == name]
+        if not matches:
+            raise LookupError("{} not found".format(symbol))
+        stmt = matches[-1]
+    return stmt
+
+
+def select_symbols(suite, symbols):
+    selected = Suite()
+    for symbol in symbols:
+        selected.add_statement(find_symbol(suite, symbol))
+    return selected
+
+
 class Indent:
     def __init__(self, indent_level=0, indent_step=4):
         self.level = indent_level
@@ -190,6 +513,10 @@ class Indent:
     def __add__(self, indent_increase):
         return type(self)(self.level + indent_increase, self.step)
 
+    def define(self, stmt):
+        """Called just before a definition or assignment is displayed"""
+        pass
+
 
 class IndentPrint(Indent):
     def indent(self, string):
@@ -218,10 +545,50 @@ class IndentString(Indent):
         return "\n".join(self.lines)
 
 
+class IndentStream(Indent):
+    """
+    Like IndentString, but each line goes to stream as soon as it is
+    displayed instead of being collected.  Lines are separated by "\n"
+    with no trailing newline, exactly as str() of the same object.
+    on_define, if given, is called as on_define(stmt, level, line) for
+    every definition, line being the 1-based line it is displayed on.
+    """
+
+    def __init__(self, stream, indent_level=0, indent_step=4, state=None, on_define=None):
+        Indent.__init__(self, indent_level, indent_step)
+        self.stream = stream
+        self.on_define = on_define
+        # [a line was written, the last line written was blank, lines
+        # written], shared between all indent levels
+        self.state = [False, False, 0] if state is None else state
+
+    def __add__(self, indent_increase):
+        return type(self)(self.stream, self.level + indent_increase, self.step, self.state,
+                          self.on_define)
+
+    def define(self, stmt):
+        if self.on_define is not None:
+            self.on_define(stmt, self.level, self.state[2] + 1)
+
+    def sep(self):
+        if not self.state[0] or not self.state[1]:
+            self.emit("")
+
+    def indent(self, string):
+        self.emit(" " * self.step * self.level + string)
+
+    def emit(self, line):
+        if self.state[0]:
+            self.stream.write("\n")
+        self.stream.write(line)
+        self.state[0] = True
+        self.state[1] = not line
+        self.state[2] += line.count("\n") + 1
+
+
 class Stack:
     def __init__(self):
         self._stack = []
-        self._counts = {}
 
     def __bool__(self):
         return bool(self._stack)
@@ -230,43 +597,35 @@ class Stack:
         return len(self._stack)
 
     def __contains__(self, val):
-        return self.get_count(val) > 0
-
-    def get_count(self, obj):
-        return self._counts.get(id(obj), 0)
-
-    def set_count(self, obj, val):
-        if val:
-            self._counts[id(obj)] = val
-        else:
-            del self._counts[id(obj)]
+        # Identity, not equality: PyConst and PyName compare by value.
+        # Only stores ask this, so a scan of the (shallow) stack is much
+        # cheaper than keeping counts up to date on every push and pop.
+        return any(map(is_, self._stack, repeat(val)))
 
     def pop1(self):
-        val = None
-        if self._stack:
-            val = self._stack.pop()
-        else:
+        if not self._stack:
             raise Exception('Empty stack popped!')
-        self.set_count(val, self.get_count(val) - 1)
-        return val
+        return self._stack.pop()
 
     def pop(self, count=None):
         if count is None:
-            val = self.pop1()
-            return val
-        else:
-            vals = [self.pop1() for i in range(count)]
-            vals.reverse()
-            return vals
+            return self.pop1()
+        if count > len(self._stack):
+            raise Exception('Empty stack popped!')
+        if not count:
+            return []
+        vals = self._stack[-count:]
+        del self._stack[-count:]
+        return vals
 
     def push(self, *args):
-        for val in args:
-            self.set_count(val, self.get_count(val) + 1)
-            self._stack.append(val)
+        self._stack.extend(args)
 
     def peek(self, count=None):
         if count is None:
             return self._stack[-1]
+        elif not count:
+            return []
         else:
             return self._stack[-count:]
 
@@ -281,7 +640,7 @@ def code_walker(code):
     while i < l:
         op = code[i]
         offset = 1
-        if sys.version_info >= (3, 6):
+        if target_version >= (3, 6):
             oparg = code[i + offset]
             offset += 1
         elif op >= HAVE_ARGUMENT:
@@ -289,7 +648,7 @@ def code_walker(code):
             extended_arg = 0
             offset += 2
         if op == EXTENDED_ARG:
-            if sys.version_info >= (3, 6):
+            if target_version >= (3, 6):
                 op = code[i + offset]
                 offset += 1
                 oparg <<= 8
@@ -301,6 +660,49 @@ def code_walker(code):
         i += offset
 
 
+def decode_wordcode(code):
+    """
+    Decode 3.6+ wordcode in bulk into (offsets, opcodes, args) arrays,
+    giving exactly what code_walker yields.  Opcodes and args are split
+    with slices; only EXTENDED_ARG prefixes are folded one by one.
+    """
+    opcode_bytes = code[0::2]
+    opcodes = array('B', opcode_bytes)
+    args = array('L', array('B', code[1::2]))
+    offsets = array('L', range(0, len(code), 2))
+    k = opcode_bytes.find(EXTENDED_ARG)
+    if k < 0:
+        return offsets, opcodes, args
+    folded = array('L'), array('B'), array('L')
+    prev = 0
+    while k >= 0:
+        # As in code_walker, EXTENDED_ARG takes the following opcode and
+        # shifts its own arg in front of that opcode's arg, at its offset
+        for column, values in zip(folded, (offsets, opcodes, args)):
+            column.extend(values[prev:k])
+        folded[0].append(offsets[k])
+        folded[1].append(opcodes[k + 1])
+        folded[2].append(args[k] << 8 | args[k + 1])
+        prev = k + 2
+        k = opcode_bytes.find(EXTENDED_ARG, prev)
+    for column, values in zip(folded, (offsets, opcodes, args)):
+        column.extend(values[prev:])
+    return folded
+
+
+def walk_code(code):
+    offsets, opcodes, args = array('L'), array('B'), array('L')
+    for offset, (op, arg) in code_walker(code):
+        offsets.append(offset)
+        opcodes.append(op)
+        args.append(arg)
+    return offsets, opcodes, args
+
+
+# Wordcode has a fixed layout, so it can be decoded in bulk
+decode_code = decode_wordcode if target_version >= (3, 6) else walk_code
+
+
 class CodeFlags(object):
     def __init__(self, cf):
         self.flags = cf
@@ -354,14 +756,25 @@ class Code:
         self.consts = list(map(PyConst, code_obj.co_consts))
         self.names = list(map(PyName, code_obj.co_names))
         self.varnames = list(map(PyName, code_obj.co_varnames))
-        self.instr_seq = list(code_walker(code_obj.co_code))
-        self.instr_map = {addr: i for i, (addr, _) in enumerate(self.instr_seq)}
+        # The instruction stream is kept in parallel columns indexed by
+        # instruction index; Address is a small view over one row
+        self.offsets, self.opcodes, self.args = decode_code(code_obj.co_code)
+        self.instr_map = {offset: i for i, offset in enumerate(self.offsets)}
+        self._opcode_index = None
         self.name = code_obj.co_name
         self.globals = []
         self.nonlocals = []
-        self.jump_targets = []
+        # Instruction indices, so membership tests are O(1) set lookups
+        self.jump_targets = set()
         self.find_else()
         self.find_jumps()
+        # The listing is only built when a trace function is installed,
+        # as formatting every Address is costly on large modules
+        if current_trace is not _trace:
+            self.trace_listing()
+        self.flags: CodeFlags = CodeFlags(code_obj.co_flags)
+
+    def trace_listing(self):
         trace('================================================')
         trace(self.code_obj)
         trace('================================================')
@@ -370,14 +783,22 @@ class Code:
             if addr.opcode in stmt_opcodes or addr.opcode in pop_jump_if_opcodes:
                 trace(' ')
         trace('================================================')
-        self.flags: CodeFlags = CodeFlags(code_obj.co_flags)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def opcode_index(self) -> OpcodeIndex:
+        if self._opcode_index is None:
+            self._opcode_index = OpcodeIndex(self.opcodes)
+        return self._opcode_index
 
     def __getitem__(self, instr_index):
-        if 0 <= instr_index < len(self.instr_seq):
+        if 0 <= instr_index < len(self.offsets):
             return Address(self, instr_index)
 
     def __iter__(self):
-        for i in range(len(self.instr_seq)):
+        for i in range(len(self.offsets)):
             yield Address(self, i)
 
     def show(self):
@@ -392,10 +813,9 @@ class Code:
 
     def find_jumps(self):
         for addr in self:
-            opcode, arg = addr
             jt = addr.jump()
             if jt:
-                self.jump_targets.append(jt)
+                self.jump_targets.add(jt.index)
 
     def find_else(self):
         jumps = {}
@@ -407,7 +827,7 @@ class Code:
                 if (jump_addr[-1].opcode in else_jump_opcodes
                         or jump_addr.opcode == FOR_ITER):
                     last_jump = addr
-                    jumps[jump_addr] = addr
+                    jumps[jump_addr.index] = addr.index
             elif opcode == JUMP_ABSOLUTE:
                 # This case is to deal with some nested ifs such as:
                 # if a:
@@ -415,17 +835,17 @@ class Code:
                 #         f()
                 #     elif c:
                 #         g()
-                jump_addr = self.address(arg)
-                if jump_addr in jumps:
-                    jumps[addr] = jumps[jump_addr]
+                jump_index = self.instr_map[arg]
+                if jump_index in jumps:
+                    jumps[addr.index] = jumps[jump_index]
             elif opcode == JUMP_FORWARD:
-                jump_addr = addr[1] + arg
-                if jump_addr in jumps:
-                    jumps[addr] = jumps[jump_addr]
+                jump_index = self.instr_map[addr[1].addr + arg]
+                if jump_index in jumps:
+                    jumps[addr.index] = jumps[jump_index]
             elif opcode in stmt_opcodes and last_jump is not None:
                 # This opcode will generate a statement, so it means
                 # that the last POP_JUMP_IF_x was an else-jump
-                jumps[addr] = last_jump
+                jumps[addr.index] = last_jump.index
         self.else_jumps = set(jumps.values())
 
     def get_suite(self, include_declarations=True, look_for_docstring=False) -> Suite:
@@ -482,22 +902,70 @@ class Code:
 
 
 
+class OpcodeIndex:
+    """
+    Where each opcode occurs in a Code object, so the control flow
+    recovery in SuiteDecompiler can find the next or previous instruction
+    of interest with a bisect instead of walking the stream.
+
+    Built once per Code on first use (see Code.opcode_index) and kept up
+    to date by Address.change_instr.
+    """
+
+    def __init__(self, opcodes):
+        self.positions = {}
+        for i, opcode in enumerate(opcodes):
+            self.positions.setdefault(opcode, []).append(i)
+
+    def change(self, index, old, new):
+        if old != new:
+            positions = self.positions[old]
+            del positions[bisect_left(positions, index)]
+            insort(self.positions.setdefault(new, []), index)
+
+    def next_op(self, opcodes, index):
+        """Index of the first instruction at or after index with one of opcodes"""
+        found = None
+        for opcode in opcodes:
+            positions = self.positions.get(opcode)
+            if positions:
+                i = bisect_left(positions, index)
+                if i < len(positions) and (found is None or positions[i] < found):
+                    found = positions[i]
+        return found
+
+    def prev_op(self, opcodes, index):
+        """Index of the last instruction at or before index with one of opcodes"""
+        found = None
+        for opcode in opcodes:
+            positions = self.positions.get(opcode)
+            if positions:
+                i = bisect_right(positions, index) - 1
+                if i >= 0 and (found is None or positions[i] > found):
+                    found = positions[i]
+        return found
+
+
 class Address:
+    __slots__ = ('code', 'index', 'addr', 'opcode', 'arg')
+
     def __init__(self, code, instr_index):
         self.code = code
         self.index = instr_index
-        self.addr, (self.opcode, self.arg) = code.instr_seq[instr_index]
+        self.addr = code.offsets[instr_index]
+        self.opcode = code.opcodes[instr_index]
+        self.arg = code.args[instr_index]
 
     def __eq__(self, other):
-        return (isinstance(other, type(self))
-                and self.code == other.code and self.index == other.index)
+        return self is other or (isinstance(other, type(self))
+                                 and self.code == other.code and self.index == other.index)
 
     def __lt__(self, other):
         return other is None or (isinstance(other, type(self))
                                  and self.code == other.code and self.index < other.index)
 
     def __str__(self):
-        mark = "* " if self in self.code.else_jumps else "  "
+        mark = "* " if self.is_else_jump() else "  "
         jump = self.jump()
         jt = '>>' if self.is_jump_target() else '  '
         arg = self.arg or "  "
@@ -543,29 +1011,36 @@ class Address:
         return hash((self.code, self.index))
 
     def is_else_jump(self):
-        return self in self.code.else_jumps
+        return self.index in self.code.else_jumps
 
     def is_jump_target(self):
-        return self in self.code.jump_targets
+        return self.index in self.code.jump_targets
 
     def change_instr(self, opcode, arg=None):
-        self.code.instr_seq[self.index] = (self.addr, (opcode, arg))
+        if self.code._opcode_index is not None:
+            self.code._opcode_index.change(self.index, self.opcode, opcode)
+        self.code.opcodes[self.index] = self.opcode = opcode
+        self.code.args[self.index] = self.arg = arg or 0
 
     def jump(self) -> Address:
         opcode = self.opcode
-        if opcode in dis.hasjrel:
+        if opcode in hasjrel:
             return self[1] + self.arg
-        elif opcode in dis.hasjabs:
+        elif opcode in hasjabs:
             return self.code.address(self.arg)
 
     def seek(self, opcode: tuple, increment: int, end: Address = None) -> Address:
         if not isinstance(opcode, tuple):
             opcode = (opcode,)
-        a = self[increment]
-        while a and a != end:
-            if a.opcode in opcode:
-                return a
-            a = a[increment]
+        index = self.code.opcode_index
+        if increment > 0:
+            found = index.next_op(opcode, self.index + 1)
+            stopped = found is not None and end is not None and self.index < end.index <= found
+        else:
+            found = index.prev_op(opcode, self.index - 1)
+            stopped = found is not None and end is not None and found <= end.index < self.index
+        if found is not None and not stopped:
+            return self.code[found]
 
     def seek_back(self, opcode: Union[tuple,int], end: Address = None) -> Address:
         return self.seek(opcode, -1, end)
@@ -966,7 +1441,7 @@ class PyComp(PyExpr):
         assert not defaults and not kwdefaults
         self.code = code
         code[0].change_instr(NOP)
-        last_i = len(code.instr_seq) - 1
+        last_i = len(code) - 1
         code[last_i].change_instr(NOP)
         self.annotations = annotations
 
@@ -1075,6 +1550,15 @@ class PyStatement(object):
         self.display(istr)
         return str(istr)
 
+    def emit(self, stream, on_define=None):
+        """
+        Write str(self) to stream line by line as it is displayed and
+        return the number of lines written
+        """
+        indent = IndentStream(stream, on_define=on_define)
+        self.display(indent)
+        return indent.state[2]
+
     def wrap(self, condition=True):
         if condition:
             assert not condition
@@ -1113,6 +1597,7 @@ class AssignStatement(PyStatement):
         self.chain = chain
 
     def display(self, indent):
+        indent.define(self)
         indent.write(" = ".join(map(str, self.chain)))
 
 
@@ -1279,6 +1764,7 @@ class DecorableStatement(PyStatement):
         indent.sep()
         for f in reversed(self.decorators):
             indent.write("@{}", f)
+        indent.define(self)
         self.display_undecorated(indent)
         indent.sep()
 
@@ -1448,6 +1934,15 @@ class Suite:
         self.display(istr)
         return str(istr)
 
+    def emit(self, stream, on_define=None):
+        """
+        Write str(self) to stream line by line as it is displayed and
+        return the number of lines written
+        """
+        indent = IndentStream(stream, on_define=on_define)
+        self.display(indent)
+        return indent.state[2]
+
     def display(self, indent):
         if self.statements:
             for stmt in self.statements:
@@ -1509,18 +2004,31 @@ class SuiteDecompiler:
 
     def run(self):
         addr, end_addr = self.start_addr, self.end_addr
-        while addr and addr < end_addr:
-            opcode, arg = addr
-            method = getattr(self, opname[opcode])
-            if opcode < HAVE_ARGUMENT:
-                new_addr = method(addr)
-            else:
-                new_addr = method(addr, arg)
-            if new_addr is self.END_NOW:
-                break
-            elif new_addr is None:
-                new_addr = addr[1]
-            addr = new_addr
+        dispatch_table = self.dispatch_table
+        try:
+            while addr and addr < end_addr:
+                opcode = addr.opcode
+                method = dispatch_table[opcode]
+                if method is None:
+                    raise NotImplementedError("Unsupported opcode {} at offset {} in {}".format(
+                        opname[opcode], addr.addr, self.code.name))
+                if opcode < HAVE_ARGUMENT:
+                    new_addr = method(self, addr)
+                else:
+                    new_addr = method(self, addr, addr.arg)
+                if new_addr is self.END_NOW:
+                    break
+                elif new_addr is None:
+                    new_addr = addr[1]
+                addr = new_addr
+        except Exception as ex:
+            # Record the instruction whose handler failed.  Nested
+            # decompilers see the exception first, so keep theirs.
+            if not hasattr(ex, 'unpyc3_opname'):
+                ex.unpyc3_opname = opname[addr.opcode]
+                ex.unpyc3_offset = addr.addr
+                ex.unpyc3_code_name = self.code.name
+            raise
         return addr
 
     def write(self, template, *args):
@@ -1540,53 +2048,39 @@ class SuiteDecompiler:
         val = self.stack.pop()
         val.store(self, dest)
 
+    def scan_forward(self, addr, end_addr, opcodes):
+        """
+        First instruction from addr onwards with one of opcodes, or None
+        if end_addr comes first
+        """
+        found = self.code.opcode_index.next_op(opcodes, addr.index)
+        if found is None or end_addr is not None and addr.index <= end_addr.index <= found:
+            return None
+        return self.code[found]
+
     def is_for_loop(self, addr, end_addr):
-        i = 0
-        while 1:
-            cur_addr = addr[i]
-            if cur_addr == end_addr:
-                break
-            elif cur_addr.opcode in else_jump_opcodes:
-                cur_addr = cur_addr.jump()
-                if cur_addr and cur_addr.opcode in for_jump_opcodes:
-                    return True
-                break
-            elif cur_addr.opcode in for_jump_opcodes:
-                return True
-            i = i + 1
-        return False
+        cur_addr = self.scan_forward(addr, end_addr, for_loop_scan_opcodes)
+        if cur_addr is None:
+            return False
+        elif cur_addr.opcode in else_jump_opcodes:
+            cur_addr = cur_addr.jump()
+            return bool(cur_addr and cur_addr.opcode in for_jump_opcodes)
+        return True
 
     def scan_to_first_jump_if(self, addr: Address, end_addr: Address) -> Union[Address,None]:
-        i = 0
-        while 1:
-            cur_addr = addr[i]
-            if cur_addr == end_addr:
-                break
-            elif cur_addr.opcode in pop_jump_if_opcodes:
-                return cur_addr
-            elif cur_addr.opcode in else_jump_opcodes:
-                break
-            elif cur_addr.opcode in for_jump_opcodes:
-                break
-            i = i + 1
+        cur_addr = self.scan_forward(addr, end_addr, first_jump_if_scan_opcodes)
+        if cur_addr is not None and cur_addr.opcode in pop_jump_if_opcodes:
+            return cur_addr
         return None
 
     def scan_for_final_jump(self, start_addr, end_addr):
-        i = 0
-        end = None
-        while 1:
-            cur_addr = end_addr[i]
-            if cur_addr == start_addr:
-                break
-            elif cur_addr.opcode == JUMP_ABSOLUTE:
-                end = cur_addr
-                return end
-            elif cur_addr.opcode in else_jump_opcodes:
-                break
-            elif cur_addr.opcode in pop_jump_if_opcodes:
-                break
-            i = i - 1
-        return end
+        found = self.code.opcode_index.prev_op(final_jump_scan_opcodes, end_addr.index)
+        if found is None or found <= start_addr.index <= end_addr.index:
+            return None
+        cur_addr = self.code[found]
+        if cur_addr.opcode == JUMP_ABSOLUTE:
+            return cur_addr
+        return None
 
     #
     # All opcode methods in CAPS below.
@@ -1647,7 +2141,7 @@ class SuiteDecompiler:
         start_except = addr.jump()
         start_try = addr[1]
         end_try = start_except
-        if sys.version_info < (3, 7):
+        if target_version < (3, 7):
             if end_try.opcode == JUMP_FORWARD:
                 end_try = end_try[1] + end_try.arg
             elif end_try.opcode == JUMP_ABSOLUTE:
@@ -1703,7 +2197,7 @@ class SuiteDecompiler:
         d_with.run()
         with_stmt.suite = d_with.suite
         self.suite.add_statement(with_stmt)
-        if sys.version_info <= (3, 4):
+        if target_version <= (3, 4):
             assert end_with.opcode == WITH_CLEANUP
             assert end_with[1].opcode == END_FINALLY
             return end_with[2]
@@ -2019,7 +2513,7 @@ class SuiteDecompiler:
             self.stack.push(func_call)
 
     def CALL_FUNCTION(self, addr, argc, have_var=False, have_kw=False):
-        if sys.version_info >= (3, 6):
+        if target_version >= (3, 6):
             pos_argc = argc
             posargs = self.stack.pop(pos_argc)
             func = self.stack.pop()
@@ -2039,7 +2533,7 @@ class SuiteDecompiler:
         self.CALL_FUNCTION(addr, argc, have_var=True)
 
     def CALL_FUNCTION_KW(self, addr, argc):
-        if sys.version_info >= (3, 6):
+        if target_version >= (3, 6):
             keys = self.stack.pop()
             kwargc = len(keys.val)
             kwarg_values = self.stack.pop(kwargc)
@@ -2145,7 +2639,7 @@ class SuiteDecompiler:
 
     def BUILD_MAP(self, addr, count):
         d = PyDict()
-        if sys.version_info >= (3, 5):
+        if target_version >= (3, 5):
             for i in range(count):
                 d.items.append(tuple(self.stack.pop(2)))
         self.stack.push(d)
@@ -2497,7 +2991,7 @@ class SuiteDecompiler:
         self.stack.push(func_maker(code, defaults, kwdefaults, closure, annotations, annotations))
 
     def MAKE_FUNCTION(self, addr, argc, is_closure=False):
-        if sys.version_info < (3, 6):
+        if target_version < (3, 6):
             self.MAKE_FUNCTION_OLD(addr, argc, is_closure)
         else:
             self.MAKE_FUNCTION_NEW(addr, argc, is_closure)
@@ -2569,7 +3063,7 @@ class SuiteDecompiler:
         d_with.run()
         with_stmt.suite = d_with.suite
         self.suite.add_statement(with_stmt)
-        if sys.version_info <= (3, 4):
+        if target_version <= (3, 4):
             assert end_with.opcode == WITH_CLEANUP
             assert end_with[1].opcode == END_FINALLY
             return end_with[2]
@@ -2640,10 +3134,24 @@ for op, name, ptn, prec, inplace_ptn in binary_ops:
         globals()[tp_name] = tp
         setattr(SuiteDecompiler, inplace_op, make_dynamic_instr(tp))
 
+
+def build_dispatch_table(cls):
+    """
+    Map every opcode to its handler on cls (None if it has none), so
+    SuiteDecompiler.run does not look handlers up by name on each
+    instruction.  Must be called again if handlers are added to cls.
+    """
+    cls.dispatch_table = [getattr(cls, name, None) for name in opname]
+
+
+build_dispatch_table(SuiteDecompiler)
+
 if __name__ == "__main__":
     import sys
 
     if len(sys.argv) == 1:
-        print('USAGE: {} <filename.pyc>'.format(sys.argv[0]))
+        print('USAGE: {} <filename.pyc> [-s Class.method ...]'.format(sys.argv[0]))
+    elif len(sys.argv) > 2 and sys.argv[2] in ('-s', '--symbols'):
+        print(decompile(sys.argv[1], symbols=sys.argv[3:]))
     else:
         print(decompile(sys.argv[1]))
@@ -0,0 +1,34 @@
+"""
+Checks that the bulk wordcode decoder gives exactly what code_walker
+yields for every code object in every .pyc of the game's Gameplay
+archives, and times both.
+
+    python -m benchmarks.code_walker [folder]
+
+folder defaults to the game's Gameplay folders from settings.py.
+"""
+import sys
+import time
+
+from Utilities.unpyc3 import decode_code, walk_code
+from benchmarks.corpus import folders_from_argv, iter_pycs, load_code, nested_code_objects
+
+
+def time_decoder(decoder, codes):
+    start = time.perf_counter()
+    for code in codes:
+        decoder(code)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    codes = []
+    for name, data in iter_pycs(folders_from_argv(sys.argv)):
+        codes.extend(code_obj.co_code for code_obj in nested_code_objects(load_code(data)))
+    mismatches = sum(1 for code in codes if decode_code(code) != walk_code(code))
+    walker = min(time_decoder(walk_code, codes) for i in range(3))
+    bulk = min(time_decoder(decode_code, codes) for i in range(3))
+    instructions = sum(len(code) // 2 for code in codes)
+    print('{} code objects, {} instructions, {} mismatches'.format(len(codes), instructions, mismatches))
+    print('code_walker: {:.3f}s'.format(walker))
+    print('{}: {:.3f}s'.format(decode_code.__name__, bulk))
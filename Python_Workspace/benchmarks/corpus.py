@@ -0,0 +1,55 @@
+import fnmatch
+import os
+from zipfile import PyZipFile
+
+from Utilities import script_package_types
+from Utilities.unpyc3 import decompile, read_pyc
+
+
+def gameplay_folders():
+    from settings import game_folder
+    return [
+        os.path.join(game_folder, 'Data', 'Simulation', 'Gameplay'),
+        os.path.join(game_folder, 'Game', 'Bin', 'Python'),
+    ]
+
+
+def iter_pycs(folders):
+    # Yields (name, bytes) for every loose .pyc and every .pyc member of
+    # the script archives under folders
+    for folder in folders:
+        for root, dirs, files in os.walk(folder):
+            for filename in fnmatch.filter(files, '*.pyc'):
+                path = os.path.join(root, filename)
+                with open(path, 'rb') as f:
+                    yield path, f.read()
+            for ext_filter in script_package_types:
+                for filename in fnmatch.filter(files, ext_filter):
+                    with PyZipFile(os.path.join(root, filename)) as zip:
+                        for name in fnmatch.filter(zip.namelist(), '*.pyc'):
+                            yield filename + '/' + name, zip.read(name)
+
+
+def largest_pycs(folders, count):
+    pycs = sorted(iter_pycs(folders), key=lambda item: len(item[1]), reverse=True)
+    return pycs[:count]
+
+
+def render(data):
+    # Function and class bodies are only decompiled when displayed
+    return ''.join(str(statement) + '\r' for statement in decompile(data).statements)
+
+
+def load_code(data):
+    return read_pyc(data)
+
+
+def nested_code_objects(code_obj):
+    yield code_obj
+    for const in code_obj.co_consts:
+        if hasattr(const, 'co_code'):
+            yield from nested_code_objects(const)
+
+
+def folders_from_argv(argv):
+    return argv[1:2] or gameplay_folders()
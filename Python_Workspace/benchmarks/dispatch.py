@@ -0,0 +1,52 @@
+"""
+Times how SuiteDecompiler resolves the handler of each instruction:
+the old getattr(self, opname[opcode]) lookup against the precomputed
+dispatch table, over the instruction mix of the largest modules.
+
+    python -m benchmarks.dispatch [folder] [count]
+
+folder defaults to the game's Gameplay folders from settings.py.
+"""
+import sys
+import time
+
+from Utilities.unpyc3 import Code, SuiteDecompiler, opname
+from benchmarks.corpus import folders_from_argv, largest_pycs, load_code, nested_code_objects
+
+
+def best_of(repeat, fn, *args):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def resolve_by_name(dec, opcodes):
+    for opcode in opcodes:
+        getattr(dec, opname[opcode], None)
+
+
+def resolve_by_table(dec, opcodes):
+    dispatch_table = dec.dispatch_table
+    for opcode in opcodes:
+        dispatch_table[opcode]
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    opcodes = []
+    dec = None
+    for name, data in largest_pycs(folders_from_argv(sys.argv), count):
+        for code_obj in nested_code_objects(load_code(data)):
+            code = Code(code_obj)
+            opcodes.extend(code.opcodes)
+            if dec is None:
+                dec = SuiteDecompiler(code[0])
+    by_name = best_of(5, resolve_by_name, dec, opcodes)
+    by_table = best_of(5, resolve_by_table, dec, opcodes)
+    print('{} instructions'.format(len(opcodes)))
+    print('getattr by name: {:.4f}s ({:.0f} ns/instr)'.format(by_name, by_name / len(opcodes) * 1e9))
+    print('dispatch table:  {:.4f}s ({:.0f} ns/instr)'.format(by_table, by_table / len(opcodes) * 1e9))
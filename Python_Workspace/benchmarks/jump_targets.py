@@ -0,0 +1,41 @@
+"""
+Times the jump target and else-jump lookups of unpyc3.Code on the
+largest modules of the game, against a list scan like the one
+Code.jump_targets used to do.
+
+    python -m benchmarks.jump_targets [folder] [count]
+
+folder defaults to the game's Gameplay folders from settings.py.
+"""
+import sys
+import time
+
+from Utilities.unpyc3 import Code
+from benchmarks.corpus import folders_from_argv, largest_pycs, load_code, nested_code_objects, render
+
+
+def time_lookups(codes, lookup):
+    start = time.perf_counter()
+    for code in codes:
+        for addr in code:
+            lookup(code, addr)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print('{:<60} {:>7} {:>10} {:>10} {:>10}'.format('module', 'instrs', 'list (s)', 'set (s)', 'total (s)'))
+    for name, data in largest_pycs(folders_from_argv(sys.argv), count):
+        codes = [Code(code_obj) for code_obj in nested_code_objects(load_code(data))]
+        instrs = sum(len(code) for code in codes)
+        # The old layout: a list of Address objects scanned with __eq__
+        lists = {code: [code[i] for i in sorted(code.jump_targets)] for code in codes}
+        list_time = time_lookups(codes, lambda code, addr: addr in lists[code])
+        set_time = time_lookups(codes, lambda code, addr: addr.is_jump_target())
+        start = time.perf_counter()
+        try:
+            render(data)
+            total = '{:.3f}'.format(time.perf_counter() - start)
+        except Exception:
+            total = 'FAILED'
+        print('{:<60} {:>7} {:>10.4f} {:>10.4f} {:>10}'.format(name[-60:], instrs, list_time, set_time, total))
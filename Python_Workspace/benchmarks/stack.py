@@ -0,0 +1,88 @@
+"""
+Times the decompile hot loop of the largest modules with unpyc3.Stack
+against the previous design, which kept an id(obj) -> count dict in step
+with every push and pop.
+
+    python -m benchmarks.stack [folder] [count]
+
+folder defaults to the game's Gameplay folders from settings.py.
+"""
+import sys
+import time
+
+from Utilities import unpyc3
+from benchmarks.corpus import folders_from_argv, largest_pycs, render
+
+
+class CountingStack:
+    def __init__(self):
+        self._stack = []
+        self._counts = {}
+
+    def __bool__(self):
+        return bool(self._stack)
+
+    def __len__(self):
+        return len(self._stack)
+
+    def __contains__(self, val):
+        return self.get_count(val) > 0
+
+    def get_count(self, obj):
+        return self._counts.get(id(obj), 0)
+
+    def set_count(self, obj, val):
+        if val:
+            self._counts[id(obj)] = val
+        else:
+            del self._counts[id(obj)]
+
+    def pop1(self):
+        if not self._stack:
+            raise Exception('Empty stack popped!')
+        val = self._stack.pop()
+        self.set_count(val, self.get_count(val) - 1)
+        return val
+
+    def pop(self, count=None):
+        if count is None:
+            return self.pop1()
+        vals = [self.pop1() for i in range(count)]
+        vals.reverse()
+        return vals
+
+    def push(self, *args):
+        for val in args:
+            self.set_count(val, self.get_count(val) + 1)
+            self._stack.append(val)
+
+    def peek(self, count=None):
+        if count is None:
+            return self._stack[-1]
+        else:
+            return self._stack[-count:]
+
+
+def time_render(pycs, stack_class):
+    unpyc3.Stack = stack_class
+    start = time.perf_counter()
+    for name, data in pycs:
+        try:
+            render(data)
+        except Exception:
+            pass
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    pycs = largest_pycs(folders_from_argv(sys.argv), count)
+    stack_class = unpyc3.Stack
+    try:
+        counting = min(time_render(pycs, CountingStack) for i in range(3))
+        current = min(time_render(pycs, stack_class) for i in range(3))
+    finally:
+        unpyc3.Stack = stack_class
+    print('{} modules'.format(len(pycs)))
+    print('id-count stack: {:.3f}s'.format(counting))
+    print('list stack:     {:.3f}s'.format(current))
@@ -0,0 +1,230 @@
+"""
+Generates a deterministic corpus of Python 3.7 modules exercising what
+EA code is made of (large classes, deep nesting, try/except/finally,
+with, comprehensions, f-strings, closures and async code) and compiles
+it to .pyc with a Python 3.7 interpreter, so unpyc3 can be benchmarked
+without the game installed.  The interpreter is python3.7 from the PATH
+unless this runs on 3.7 itself or --python names another one.
+
+    python -m benchmarks.synthetic [--python PATH] [--modules N] [--seed S]
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+
+corpus_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'synthetic_corpus')
+
+# Compiles every path given on the command line to path + 'c'
+compile_script = 'import py_compile, sys\n' \
+                 'if sys.version_info[:2] != (3, 7):\n' \
+                 '    sys.exit("Python %d.%d is not 3.7" % sys.version_info[:2])\n' \
+                 'for path in sys.argv[1:]:\n' \
+                 '    py_compile.compile(path, path + "c", doraise=True)\n'
+
+exceptions = ['ValueError', 'KeyError', 'TypeError', 'AttributeError', 'RuntimeError', 'IndexError']
+
+
+class ModuleGenerator:
+    """
+    Writes the source of one module.  Statements only have to compile,
+    never run, so names are drawn freely from a small vocabulary.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.lines = []
+        self.level = 0
+        self.counter = 0
+
+    def line(self, text):
+        self.lines.append('    ' * self.level + text)
+
+    def name(self, prefix='v'):
+        self.counter += 1
+        return '{}{}'.format(prefix, self.counter)
+
+    def var(self):
+        return self.rng.choice(['value', 'item', 'count', 'result', 'total', 'key', 'index', 'data'])
+
+    def expr(self):
+        r = self.rng
+        return r.choice([
+            lambda: '{} + {} * {}'.format(self.var(), self.var(), r.randint(2, 99)),
+            lambda: '[x * 2 for x in {} if x % {} == 0]'.format(self.var(), r.randint(2, 9)),
+            lambda: '{{k: v for (k, v) in {}.items() if v is not None}}'.format(self.var()),
+            lambda: '{{x % {} for x in range({})}}'.format(r.randint(2, 9), self.var()),
+            lambda: 'sum(x * x for x in {})'.format(self.var()),
+            lambda: "f'{{{}}}: {{{}!r}} ({{{} + 1}})'".format(self.var(), self.var(), self.var()),
+            lambda: '{}({}, {}, key={}, *{}, **{})'.format(
+                self.var(), self.var(), r.randint(0, 9), self.var(), self.var(), self.var()),
+            lambda: 'lambda x: (x.{}, -x.{})'.format(self.var(), self.var()),
+            lambda: '{} if {} else {}'.format(self.var(), self.var(), self.var()),
+            lambda: '{} and not {} or {}'.format(self.var(), self.var(), self.var()),
+            lambda: '{}[{}:{} + {}]'.format(self.var(), self.var(), self.var(), r.randint(1, 16)),
+            lambda: 'self.{}.get({!r}, {})'.format(self.var(), self.var(), r.randint(0, 9)),
+        ])()
+
+    def simple(self, ctx):
+        r = self.rng
+        choice = r.randrange(7)
+        if choice == 0:
+            self.line('{} += {}'.format(self.var(), self.expr()))
+        elif choice == 1:
+            self.line('{}, {} = {}, {}'.format(self.var(), self.var(), self.var(), self.var()))
+        elif choice == 2:
+            self.line('self.{} = {}'.format(self.var(), self.expr()))
+        elif choice == 3 and 'async' in ctx:
+            self.line('{} = await {}({})'.format(self.var(), self.var(), self.var()))
+        else:
+            self.line('{} = {}'.format(self.var(), self.expr()))
+
+    def body(self, depth, ctx, size=None):
+        r = self.rng
+        self.level += 1
+        for i in range(size or r.randint(2, 4)):
+            if depth > 0 and r.random() < 0.35:
+                self.compound(depth - 1, ctx)
+            else:
+                self.simple(ctx)
+        # Jumps out only ever end a block, as there is no dead code in
+        # real modules, and never leave a finally clause
+        if r.random() < 0.2 and 'finally' not in ctx:
+            if 'loop' in ctx:
+                self.line(r.choice(['break', 'continue']))
+            else:
+                self.line('return {}'.format(self.expr()))
+        self.level -= 1
+
+    def compound(self, depth, ctx):
+        r = self.rng
+        choice = r.randrange(7 if 'async' in ctx else 6)
+        if choice == 0:
+            self.line('if {} > {}:'.format(self.var(), r.randint(0, 99)))
+            self.body(depth, ctx)
+            if r.random() < 0.5:
+                self.line('elif {} in {}:'.format(self.var(), self.var()))
+                self.body(depth, ctx)
+            self.line('else:')
+            self.body(depth, ctx)
+        elif choice == 1:
+            self.line('for {} in {}:'.format(self.var(), self.var()))
+            self.body(depth, ctx | {'loop'})
+        elif choice == 2:
+            self.line('while {} < {}:'.format(self.var(), r.randint(1, 99)))
+            self.body(depth, ctx | {'loop'})
+        elif choice == 3:
+            self.line('try:')
+            self.body(depth, ctx)
+            for i in range(r.randint(1, 2)):
+                self.line('except {} as {}:'.format(r.choice(exceptions), self.name('ex')))
+                self.body(depth, ctx)
+            if r.random() < 0.5:
+                self.line('finally:')
+                self.body(depth, ctx | {'finally'})
+        elif choice == 4:
+            self.line('with {}({}) as {}:'.format(self.var(), self.var(), self.name('ctx')))
+            self.body(depth, ctx)
+        elif choice == 5:
+            name = self.name('inner')
+            self.line('def {}({}, *args, **kwargs):'.format(name, self.var()))
+            self.body(depth, ctx - {'loop', 'finally', 'async'})
+            self.line('{} = {}({})'.format(self.var(), name, self.var()))
+        elif r.random() < 0.5:
+            self.line('async for {} in {}:'.format(self.var(), self.var()))
+            self.body(depth, ctx | {'loop'})
+        else:
+            self.line('async with {}() as {}:'.format(self.var(), self.name('ctx')))
+            self.body(depth, ctx)
+
+    def function(self, name, depth, is_async=False, method=True):
+        params = ['self'] if method else []
+        params += ['{}={}'.format(p, d) for p, d in zip(['key', 'count'], [None, self.rng.randint(0, 9)])]
+        self.line('{}def {}({}):'.format('async ' if is_async else '', name, ', '.join(params)))
+        self.level += 1
+        self.line("'''{} docstring'''".format(name))
+        self.level -= 1
+        self.body(depth, {'async'} if is_async else set(), size=self.rng.randint(3, 6))
+        self.line('')
+
+    def klass(self, name, methods, depth):
+        self.line('class {}({}):'.format(name, self.rng.choice(['object', 'Base', 'Mixin, Base'])))
+        self.level += 1
+        self.line("'''{} docstring'''".format(name))
+        for i in range(self.rng.randint(2, 6)):
+            self.line('{} = {}'.format(self.name('ATTR_').upper(), self.rng.randint(0, 999)))
+        self.line('')
+        for i in range(methods):
+            self.function(self.name('method_'), depth, is_async=self.rng.random() < 0.1)
+        self.level -= 1
+
+    def module(self):
+        r = self.rng
+        self.line("'''Synthetic benchmark module'''")
+        self.line('import os')
+        self.line('from collections import defaultdict')
+        self.line('')
+        for i in range(r.randint(2, 5)):
+            self.function(self.name('function_'), r.randint(2, 3), is_async=r.random() < 0.2, method=False)
+        for i in range(r.randint(1, 4)):
+            self.klass(self.name('Class'), r.randint(8, 40), r.randint(1, 3))
+        return '\n'.join(self.lines) + '\n'
+
+
+def corpus_folder(seed, modules):
+    return os.path.join(corpus_root, '{}-{}'.format(seed, modules))
+
+
+def generate(folder, seed, modules, python):
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(modules):
+        path = os.path.join(folder, 'module_{:03}.py'.format(i))
+        with open(path, 'w') as f:
+            f.write(ModuleGenerator(random.Random(rng.random())).module())
+        paths.append(path)
+    try:
+        subprocess.check_call([python, '-c', compile_script] + paths)
+    except OSError as ex:
+        raise RuntimeError('Compiling the corpus needs a Python 3.7 interpreter, given with --python '
+                           '({}: {})'.format(python, ex.strerror)) from None
+    except subprocess.CalledProcessError as ex:
+        raise RuntimeError('Compiling the corpus needs a Python 3.7 interpreter, given with --python '
+                           '({} exited with status {})'.format(python, ex.returncode)) from None
+    return [path + 'c' for path in paths]
+
+
+def load_corpus(seed, modules, python):
+    """Return [(name, pyc bytes)] of the corpus, generating it if needed"""
+    folder = corpus_folder(seed, modules)
+    pycs = [os.path.join(folder, 'module_{:03}.pyc'.format(i)) for i in range(modules)]
+    if not all(os.path.exists(pyc) for pyc in pycs):
+        pycs = generate(folder, seed, modules, python)
+    corpus = []
+    for pyc in pycs:
+        with open(pyc, 'rb') as f:
+            corpus.append((os.path.basename(pyc), f.read()))
+    return corpus
+
+
+def default_python():
+    return sys.executable if sys.version_info[:2] == (3, 7) else 'python3.7'
+
+
+def add_arguments(parser):
+    parser.add_argument('--python', default=default_python(),
+                        help='Python 3.7 interpreter used to compile the corpus (default: %(default)s)')
+    parser.add_argument('--modules', type=int, default=30, help='number of modules (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=1, help='corpus seed (default: %(default)s)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the synthetic benchmark corpus')
+    add_arguments(parser)
+    args = parser.parse_args()
+    folder = corpus_folder(args.seed, args.modules)
+    pycs = generate(folder, args.seed, args.modules, args.python)
+    print('{} modules, {} bytes of bytecode in {}'.format(
+        len(pycs), sum(os.path.getsize(pyc) for pyc in pycs), folder))
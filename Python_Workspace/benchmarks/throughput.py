@@ -0,0 +1,162 @@
+"""
+Measures decompile() throughput over the synthetic corpus: instructions
+and modules per second, and per module the peak traced memory and the
+memory blocks the decompile leaves allocated.  Results can be saved as a
+baseline and later runs are compared against it, flagging any metric
+that got worse by more than --threshold.
+
+    python -m benchmarks.throughput [--save] [--python PATH] [--modules N]
+
+Runs offline, but needs a Python 3.7 interpreter to compile the corpus
+(python3.7 on the PATH, or --python; see benchmarks.synthetic).
+Timings only compare on the same machine, so baselines are not
+committed: record one with --save on each machine before comparing.
+Exits with status 1 on regressions.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from Utilities.unpyc3 import count_instructions, read_pyc
+from benchmarks import synthetic
+from benchmarks.corpus import render
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'throughput_baseline.json')
+
+# Metric: True if higher is better
+metrics = {
+    'instructions_per_sec': True,
+    'modules_per_sec': True,
+    'peak_kib_max': False,
+    'retained_blocks_per_module': False,
+    'failures': False,
+}
+
+
+def measure_time(data, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        render(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure_memory(data):
+    # Run apart from the timings as tracing slows every allocation down
+    gc.collect()
+    gc.disable()
+    try:
+        blocks = sys.getallocatedblocks()
+        tracemalloc.start()
+        output = render(data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        blocks = sys.getallocatedblocks() - blocks
+        del output
+    finally:
+        gc.enable()
+    return peak, blocks
+
+
+def run(corpus, repeat):
+    modules = []
+    for name, data in corpus:
+        result = {'module': name, 'instructions': count_instructions(read_pyc(data)), 'status': 'ok'}
+        try:
+            result['seconds'] = measure_time(data, repeat)
+            result['peak_kib'], result['retained_blocks'] = measure_memory(data)
+            result['peak_kib'] /= 1024
+        except Exception as ex:
+            result.update(status='failed', error='{}: {}'.format(type(ex).__name__, ex))
+        modules.append(result)
+    ok = [result for result in modules if result['status'] == 'ok']
+    seconds = sum(result['seconds'] for result in ok)
+    totals = {
+        'modules': len(ok),
+        'failures': len(modules) - len(ok),
+        'instructions': sum(result['instructions'] for result in ok),
+        'seconds': seconds,
+        'instructions_per_sec': sum(result['instructions'] for result in ok) / seconds if seconds else 0,
+        'modules_per_sec': len(ok) / seconds if seconds else 0,
+        'peak_kib_max': max([result['peak_kib'] for result in ok], default=0),
+        'retained_blocks_per_module': sum(result['retained_blocks'] for result in ok) / len(ok) if ok else 0,
+    }
+    return totals, modules
+
+
+def regressions(totals, baseline, threshold):
+    flagged = []
+    for metric, higher_is_better in metrics.items():
+        if metric not in baseline['totals']:
+            continue
+        old, new = baseline['totals'][metric], totals[metric]
+        if metric == 'failures':
+            worse = new > old
+        elif higher_is_better:
+            worse = new < old * (1 - threshold)
+        else:
+            worse = new > old * (1 + threshold)
+        if worse:
+            flagged.append((metric, old, new))
+    return flagged
+
+
+def describe(totals):
+    return ('{modules} modules ({failures} failed), {instructions} instructions in {seconds:.2f}s: '
+            '{instructions_per_sec:.0f} instr/s, {modules_per_sec:.2f} modules/s, '
+            'peak {peak_kib_max:.0f} KiB, {retained_blocks_per_module:.0f} blocks retained/module'.format(**totals))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark unpyc3 decompile throughput')
+    synthetic.add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per module, best kept (default: %(default)s)')
+    parser.add_argument('--baseline', default=default_baseline, help='baseline JSON file (default: %(default)s)')
+    parser.add_argument('--save', action='store_true', help='record this run as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change flagged as a regression (default: %(default)s)')
+    args = parser.parse_args()
+
+    try:
+        corpus = synthetic.load_corpus(args.seed, args.modules, args.python)
+    except RuntimeError as ex:
+        print(ex)
+        sys.exit(2)
+    totals, modules = run(corpus, args.repeat)
+    print(describe(totals))
+    for result in modules:
+        if result['status'] != 'ok':
+            print('  FAILED {module}: {error}'.format(**result))
+
+    status = 0
+    if not os.path.exists(args.baseline) and not args.save:
+        print('No baseline at {}; record one on this machine with --save'.format(args.baseline))
+    elif not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if (baseline['seed'], baseline['modules']) != (args.seed, args.modules):
+            print('Baseline was recorded over a different corpus; not compared')
+        else:
+            print('Baseline: ' + describe(baseline['totals']))
+            for metric, old, new in regressions(totals, baseline, args.threshold):
+                print('REGRESSION {}: {:.2f} -> {:.2f}'.format(metric, old, new))
+                status = 1
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'seed': args.seed,
+                'modules': args.modules,
+                'python': platform.python_version(),
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'totals': totals,
+                'per_module': modules,
+            }, f, indent=1)
+        print('Saved baseline to {}'.format(args.baseline))
+    sys.exit(status)
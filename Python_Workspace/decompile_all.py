@@ -1,12 +1,33 @@
-from Utilities import extract_folder
+from Utilities import extract_folder, DecompileCache, DecompileReport, SymbolIndex
 from settings import *
 
-ea_folder = 'EA'
-if not os.path.exists(ea_folder):
-    os.mkdir(ea_folder)
+if __name__ == '__main__':
+    ea_folder = 'EA'
+    if not os.path.exists(ea_folder):
+        os.mkdir(ea_folder)
 
-gameplay_folder_data = os.path.join(game_folder, 'Data', 'Simulation', 'Gameplay')
-gameplay_folder_game = os.path.join(game_folder, 'Game', 'Bin', 'Python')
+    # Decompiled output of every .pyc seen so far, so a re-run after a
+    # game patch only decompiles the modules the patch touched
+    cache = DecompileCache('EA_cache', max_size=2 * 1024 * 1024 * 1024)
+    report = DecompileReport()
+    # Where every class, function and constant is defined, for
+    # find_symbol.py
+    index = SymbolIndex.for_folder(ea_folder)
 
-extract_folder(ea_folder,gameplay_folder_data)
-extract_folder(ea_folder,gameplay_folder_game)
\ No newline at end of file
+    gameplay_folder_data = os.path.join(game_folder, 'Data', 'Simulation', 'Gameplay')
+    gameplay_folder_game = os.path.join(game_folder, 'Game', 'Bin', 'Python')
+
+    # Decompile straight out of the game archives; only the .py output
+    # is written to EA
+    extract_folder(ea_folder, gameplay_folder_data, cache=cache,
+                   stream=True, keep_archive=False, keep_pyc=False, report=report, index=index)
+    extract_folder(ea_folder, gameplay_folder_game, cache=cache,
+                   stream=True, keep_archive=False, keep_pyc=False, report=report, index=index)
+    index.close()
+    print(cache.report())
+
+    # Per-module timings and failures, to find the unpyc3 handlers that
+    # cost the most
+    report.write_json('EA_report.json')
+    report.write_csv('EA_report.csv')
+    print(report.summary())
\ No newline at end of file
@@ -1,5 +1,6 @@
 from Utilities import decompile_dir
 from settings import *
 
-dir_path = os.path.join('D:', os.sep, 'Decompile')
-decompile_dir(dir_path)
+if __name__ == '__main__':
+    dir_path = os.path.join('D:', os.sep, 'Decompile')
+    decompile_dir(dir_path)
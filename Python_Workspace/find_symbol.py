@@ -0,0 +1,18 @@
+import sys
+
+from Utilities import SymbolIndex
+
+usage = """USAGE: find_symbol.py <query> <name>
+  defined     where name is defined, e.g. InventoryComponent.push_items_to_household_inventory
+  subclasses  classes deriving from name
+  callers     classes and functions referring to name"""
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] not in ('defined', 'subclasses', 'callers'):
+        print(usage)
+        sys.exit(1)
+    query, name = sys.argv[1:]
+    index = SymbolIndex.for_folder('EA')
+    for module, qualname, detail, path, line in getattr(index, query)(name):
+        print("EA/%s:%d: %s.%s (%s)" % (path, line, module, qualname, detail))
+    index.close()
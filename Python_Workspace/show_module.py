@@ -0,0 +1,34 @@
+import sys
+
+from Utilities import catalogue_folder, decompile, DecompileCache, LazyDecompiler, ModuleCatalogue
+from settings import *
+
+usage = """USAGE: show_module.py <module> [Class.method ...]
+       show_module.py --catalogue
+Decompiles one module of the game archives on demand, e.g.
+  show_module.py objects.components.inventory_component InventoryComponent.push_items_to_household_inventory"""
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(usage)
+        sys.exit(1)
+    ea_folder = 'EA'
+    if not os.path.exists(ea_folder):
+        os.mkdir(ea_folder)
+
+    catalogue = ModuleCatalogue.for_folder(ea_folder)
+    if sys.argv[1] == '--catalogue' or not catalogue.modules:
+        # Only the archives' central directories are read, which takes
+        # a moment, so this is redone only when asked to after a patch
+        catalogue_folder(ea_folder, os.path.join(game_folder, 'Data', 'Simulation', 'Gameplay'), catalogue)
+        catalogue_folder(ea_folder, os.path.join(game_folder, 'Game', 'Bin', 'Python'), catalogue)
+        print("Catalogued %d modules" % len(catalogue.modules))
+        if sys.argv[1] == '--catalogue':
+            sys.exit(0)
+
+    module, symbols = sys.argv[1], sys.argv[2:]
+    decompiler = LazyDecompiler(ea_folder, catalogue, DecompileCache('EA_cache', max_size=2 * 1024 * 1024 * 1024))
+    if symbols:
+        print(decompile(decompiler.read(module), symbols=symbols))
+    else:
+        print(decompiler.source(module))
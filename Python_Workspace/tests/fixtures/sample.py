@@ -0,0 +1,49 @@
+"""Decompiled by tests/test_unpyc3.py from sample.pyc, its Python 3.7 bytecode"""
+import os.path
+from collections import namedtuple as nt
+LIMIT = 10 ** 30
+RATIO = 2.5
+ROOT = 1 - 2j
+NAMES = ('alpha', 'b\xe9ta', b'raw', None, True, ...)
+TABLE = {'one': [1, 2], 'two': {3, 4}}
+Point = nt('Point', 'x y')
+
+
+def scale(values, *, factor=RATIO, **options):
+    total = 0
+    for value in values:
+        if value is None:
+            continue
+        total += value * factor
+    return total, options
+
+
+def counter(start=0):
+    count = start
+
+    def step(by=1):
+        nonlocal count
+        count += by
+        return count
+    return step
+
+
+class Inventory(object):
+    """Items by name"""
+    limit = LIMIT
+
+    def __init__(self, items=()):
+        self.items = {name: len(name) for name in items}
+
+    @property
+    def names(self):
+        return sorted(self.items, key=lambda name: (self.items[name], name))
+
+    def load(self, path):
+        try:
+            with open(path) as f:
+                return [line.strip() for line in f if line]
+        except OSError as ex:
+            raise ValueError(path) from ex
+        finally:
+            self.items.clear()
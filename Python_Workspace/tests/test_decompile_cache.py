@@ -0,0 +1,71 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from Utilities import DecompileCache, SymbolIndex, decompile_files
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class DecompileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def write(self, name, size):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write('x' * size)
+        return path
+
+    def test_store_and_fetch(self):
+        cache = DecompileCache(os.path.join(self.root, 'cache'))
+        key = cache.key(b'pyc bytes')
+        self.assertNotEqual(key, cache.key(b'other bytes'))
+        dst = os.path.join(self.root, 'out.py')
+        self.assertFalse(cache.fetch(key, dst))
+        cache.store(key, self.write('src.py', 10))
+        self.assertTrue(cache.fetch(key, dst))
+        with open(dst) as f:
+            self.assertEqual(f.read(), 'x' * 10)
+
+    def test_eviction(self):
+        cache = DecompileCache(os.path.join(self.root, 'cache'), max_size=25)
+        keys = [cache.key(bytes([i])) for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.store(key, self.write('src{}.py'.format(i), 10))
+            os.utime(cache.path(key), (i, i))
+        dst = os.path.join(self.root, 'out.py')
+        self.assertFalse(cache.fetch(keys[0], dst))
+        self.assertTrue(cache.fetch(keys[2], dst))
+
+    def test_output_format_is_part_of_the_key(self):
+        key = DecompileCache(os.path.join(self.root, 'cache')).key(b'pyc bytes')
+        with mock.patch('Utilities.output_format', 2):
+            self.assertNotEqual(DecompileCache(os.path.join(self.root, 'cache')).key(b'pyc bytes'), key)
+
+    def test_decompile_counts_hits_and_misses(self):
+        cache = DecompileCache(os.path.join(self.root, 'cache'))
+        index = SymbolIndex.for_folder(os.path.join(self.root, 'EA'))
+        self.addCleanup(index.close)
+        pyc = os.path.join(self.root, 'EA', 'sample.pyc')
+        os.makedirs(os.path.dirname(pyc))
+        shutil.copyfile(os.path.join(fixtures, 'sample.pyc'), pyc)
+        for index_arg in (index, None):
+            with redirect_stdout(io.StringIO()):
+                decompile_files([pyc], workers=1, cache=cache, index=index_arg)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # The index no longer knows the module, so it is decompiled again
+        index.remove(pyc[:-1])
+        with redirect_stdout(io.StringIO()):
+            decompile_files([pyc], workers=1, cache=cache, index=index)
+        self.assertEqual(cache.report(), 'Decompile cache: 1 hits, 2 misses, 0 evicted')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from Utilities import decompile_dir, DecompileReport
+from Utilities.unpyc3 import target_magic
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def kill_worker(src, data, py_path, collect_symbols=False):
+    os._exit(1)
+
+
+class DecompileDirTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for name in ('a.pyc', os.path.join('pkg', 'b.pyc'), os.path.join('pkg', 'c.pyc')):
+            os.makedirs(os.path.dirname(os.path.join(self.root, name)), exist_ok=True)
+            shutil.copyfile(os.path.join(fixtures, 'sample.pyc'), os.path.join(self.root, name))
+        self.broken = os.path.join(self.root, 'broken.pyc')
+        with open(self.broken, 'wb') as f:
+            f.write(target_magic + b'\0' * 12 + b'not marshal data')
+
+    def decompile(self, workers):
+        report = DecompileReport()
+        with redirect_stdout(io.StringIO()):
+            failed = decompile_dir(self.root, workers=workers, report=report)
+        return failed, {os.path.relpath(result['src'], self.root): result for result in report.results}
+
+    def outputs(self):
+        outputs = {}
+        for path, subs, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.py'):
+                    with open(os.path.join(path, filename), 'rb') as f:
+                        outputs[os.path.relpath(os.path.join(path, filename), self.root)] = f.read()
+        return outputs
+
+    def test_pool_matches_serial(self):
+        failed, results = self.decompile(workers=1)
+        serial = self.outputs()
+        self.assertEqual(failed, [self.broken])
+        for workers in (2, 4):
+            with self.subTest(workers=workers):
+                for py in serial:
+                    os.remove(os.path.join(self.root, py))
+                failed, results = self.decompile(workers=workers)
+                self.assertEqual(failed, [self.broken])
+                self.assertEqual(len(results), 4)
+                self.assertEqual(results['broken.pyc']['status'], 'failed')
+                self.assertEqual(self.outputs(), serial)
+        self.assertEqual(sorted(serial), ['a.py', os.path.join('pkg', 'b.py'), os.path.join('pkg', 'c.py')])
+
+    def test_dead_worker_fails_its_jobs(self):
+        with mock.patch('Utilities.decompile_to_file', kill_worker):
+            failed, results = self.decompile(workers=2)
+        self.assertEqual(len(failed), 4)
+        self.assertEqual({result['error_type'] for result in results.values()}, {'BrokenProcessPool'})
+        self.assertEqual(self.outputs(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from contextlib import redirect_stdout
+
+from Utilities import extract_subfolder, DecompileReport, SymbolIndex
+from Utilities.extract_manifest import ExtractManifest
+from Utilities.unpyc3 import target_magic
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+broken_pyc = target_magic + b'\0' * 12 + b'not marshal data'
+
+
+def sample_pyc():
+    with open(os.path.join(fixtures, 'sample.pyc'), 'rb') as f:
+        return f.read()
+
+
+class ExtractTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.game = os.path.join(self.root, 'game')
+        self.ea = os.path.join(self.root, 'EA')
+        os.makedirs(self.game)
+        os.makedirs(self.ea)
+        self.manifest = ExtractManifest.for_folder(self.ea)
+
+    def write_archive(self, members):
+        with zipfile.ZipFile(os.path.join(self.game, 'base.zip'), 'w') as zf:
+            for name, data in members.items():
+                zf.writestr(name, data)
+
+    def extract(self, **kwargs):
+        report = DecompileReport()
+        with redirect_stdout(io.StringIO()) as output:
+            extract_subfolder(self.game, 'base.zip', self.ea, workers=1, manifest=self.manifest, stream=True,
+                              keep_archive=False, keep_pyc=False, report=report, **kwargs)
+        return {result['src'].replace(os.sep, '/').split('/base/')[-1]: result['status']
+                for result in report.results}, output.getvalue()
+
+    def test_failed_members_are_not_retried(self):
+        self.write_archive({'broken.pyc': broken_pyc, 'data.txt': b'x'})
+        results, output = self.extract()
+        self.assertEqual(results, {'broken.pyc': 'failed'})
+        self.assertEqual(self.manifest.failed(os.path.join(self.game, 'base.zip')), ['broken.pyc'])
+        results, output = self.extract()
+        self.assertIn('Unchanged', output)
+        self.assertEqual(results, {})
+        os.utime(os.path.join(self.game, 'base.zip'), (0, 0))
+        results, output = self.extract()
+        self.assertIn('Unchanged', output)
+        self.assertEqual(self.manifest.failed(os.path.join(self.game, 'base.zip')), ['broken.pyc'])
+
+    def test_archive_without_modules_is_indexed_once(self):
+        self.write_archive({'data.txt': b'x'})
+        index = SymbolIndex.for_folder(self.ea)
+        self.addCleanup(index.close)
+        results, output = self.extract(index=index)
+        self.assertTrue(index.has_folder(os.path.join(self.ea, 'base')))
+        results, output = self.extract(index=index)
+        self.assertIn('Unchanged', output)
+
+    def test_unchanged_archive_is_skipped(self):
+        self.write_archive({'good.pyc': sample_pyc()})
+        results, output = self.extract()
+        self.assertEqual(results, {'good.pyc': 'ok'})
+        results, output = self.extract()
+        self.assertEqual(results, {})
+        self.assertIn('Unchanged', output)
+
+    def test_only_changed_members_are_decompiled(self):
+        self.write_archive({'good.pyc': sample_pyc(), 'broken.pyc': broken_pyc})
+        results, output = self.extract()
+        self.assertEqual(results, {'good.pyc': 'ok', 'broken.pyc': 'failed'})
+        self.write_archive({'good.pyc': sample_pyc(), 'broken.pyc': broken_pyc, 'new.pyc': sample_pyc()})
+        results, output = self.extract()
+        self.assertEqual(results, {'new.pyc': 'ok'})
+        self.assertEqual(self.manifest.failed(os.path.join(self.game, 'base.zip')), ['broken.pyc'])
+
+    def test_new_decompiler_decompiles_everything(self):
+        self.write_archive({'good.pyc': sample_pyc(), 'broken.pyc': broken_pyc})
+        self.extract()
+        self.manifest.version = 'another decompiler'
+        results, output = self.extract()
+        self.assertNotIn('Unchanged', output)
+        self.assertEqual(results, {'good.pyc': 'ok', 'broken.pyc': 'failed'})
+        results, output = self.extract()
+        self.assertIn('Unchanged', output)
+
+if __name__ == '__main__':
+    unittest.main()
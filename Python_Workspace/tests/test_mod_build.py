@@ -0,0 +1,229 @@
+import marshal
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from Utilities import compile_module
+from Utilities.mod_build import (BuildManifest, build_archive, canonical_marshal, compile_modules, deploy_file,
+                                 find_modules, sync_folder, write_archive)
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+class BuildTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.mod = os.path.join(self.root, 'mod')
+        self.scripts = os.path.join(self.mod, 'Scripts')
+        self.mods_folder = os.path.join(self.root, 'Mods')
+        os.makedirs(self.mods_folder)
+        write(os.path.join(self.scripts, 'top.py'), 'VALUE = 1\n')
+        write(os.path.join(self.scripts, 'pkg', '__init__.py'), '')
+        write(os.path.join(self.scripts, 'pkg', 'sub', '__init__.py'), '')
+        write(os.path.join(self.scripts, 'pkg', 'sub', 'inner.py'), "NAMES = {'alpha', 'beta', 'gamma'}\n")
+        self.ts4script = os.path.join(self.root, 'mod.ts4script')
+        self.build_folder = os.path.join(self.root, 'build')
+
+    def build(self, **kwargs):
+        return build_archive(self.scripts, self.ts4script, self.build_folder, **kwargs)
+
+    def read(self):
+        with open(self.ts4script, 'rb') as f:
+            return f.read()
+
+    def import_archive(self, module):
+        sys.path.insert(0, self.ts4script)
+        self.addCleanup(self.forget_archive, module.split('.')[0])
+        return __import__(module, fromlist=['*'])
+
+    def forget_archive(self, package):
+        sys.path.remove(self.ts4script)
+        sys.path_importer_cache.pop(self.ts4script, None)
+        for module in list(sys.modules):
+            if module.split('.')[0] == package:
+                del sys.modules[module]
+
+    def test_find_modules_names_members_as_writepy(self):
+        members = [member for member, path in find_modules(self.scripts)]
+        self.assertEqual(members, ['pkg/__init__.pyc', 'pkg/sub/__init__.pyc', 'pkg/sub/inner.pyc', 'top.pyc'])
+
+    def test_incremental_build(self):
+        for deterministic in (False, True):
+            with self.subTest(deterministic=deterministic):
+                shutil.rmtree(self.build_folder, ignore_errors=True)
+                self.assertTrue(self.build(deterministic=deterministic))
+                self.assertFalse(self.build(deterministic=deterministic))
+                write(os.path.join(self.scripts, 'top.py'), 'VALUE = 2\n')
+                self.assertTrue(self.build(deterministic=deterministic))
+                self.assertFalse(self.build(deterministic=deterministic))
+                write(os.path.join(self.scripts, 'top.py'), 'VALUE = 1\n')
+
+    def test_parallel_build_matches_serial(self):
+        for i in range(8):
+            write(os.path.join(self.scripts, 'pkg', 'module_{}.py'.format(i)),
+                  "KEYS = {{'a{0}', 'b{0}', 'c{0}', 'd{0}'}}\ndef f(x):\n    return x in KEYS\n".format(i))
+        for deterministic in (False, True):
+            with self.subTest(deterministic=deterministic):
+                archives = []
+                for workers in (1, 2):
+                    shutil.rmtree(self.build_folder, ignore_errors=True)
+                    self.build(workers=workers, deterministic=deterministic)
+                    archives.append(self.read())
+                self.assertEqual(archives[0], archives[1])
+
+    def test_removed_module_leaves_archive(self):
+        self.build()
+        os.remove(os.path.join(self.scripts, 'top.py'))
+        self.assertTrue(self.build())
+        with zipfile.ZipFile(self.ts4script) as zf:
+            self.assertNotIn('top.pyc', zf.namelist())
+
+    def test_archive_imports(self):
+        self.build()
+        self.assertEqual(self.import_archive('pkg.sub.inner').NAMES, {'alpha', 'beta', 'gamma'})
+
+    def test_deterministic_archive_imports(self):
+        self.build(deterministic=True)
+        self.assertEqual(self.import_archive('pkg.sub.inner').NAMES, {'alpha', 'beta', 'gamma'})
+
+    def test_failed_compile_keeps_last_archive(self):
+        self.build()
+        data = self.read()
+        write(os.path.join(self.scripts, 'top.py'), 'VALUE = (\n')
+        with self.assertRaises(SyntaxError):
+            self.build()
+        self.assertEqual(self.read(), data)
+        self.assertFalse(os.path.exists(self.ts4script + '.tmp'))
+
+    def test_pool_is_no_larger_than_the_work(self):
+        pools = []
+
+        def executor(max_workers):
+            pools.append(max_workers)
+            return ThreadPoolExecutor(max_workers)
+
+        stale = find_modules(self.scripts)
+        with mock.patch('Utilities.default_workers', return_value=61), \
+                mock.patch('Utilities.mod_build.ProcessPoolExecutor', executor):
+            self.assertEqual(len(list(compile_modules(stale, 2))), len(stale))
+            self.assertEqual(len(list(compile_modules(stale, 2, workers=2))), len(stale))
+        self.assertEqual(pools, [len(stale), 2])
+
+    def test_failed_write_without_temp_file_keeps_error(self):
+        tmp = self.ts4script + '.tmp'
+
+        def results():
+            os.remove(tmp)
+            raise SyntaxError('invalid syntax')
+            yield
+
+        modules = find_modules(self.scripts)
+        with self.assertRaises(SyntaxError):
+            write_archive(self.ts4script, BuildManifest(self.build_folder), modules, results(), dict(modules))
+
+    def test_compile_module(self):
+        for deterministic in (False, True):
+            with self.subTest(deterministic=deterministic):
+                deployed = os.path.join(self.mods_folder, 'me_mod.ts4script')
+                if os.path.exists(deployed):
+                    os.remove(deployed)
+                self.assertTrue(compile_module('me', self.mod, self.mods_folder, mod_name='mod',
+                                               incremental=True, deterministic=deterministic))
+                self.assertTrue(os.path.isfile(deployed))
+
+    def test_build_manifest_is_kept(self):
+        self.build()
+        manifest = BuildManifest(self.build_folder)
+        self.assertEqual(sorted(manifest.modules), [member for member, path in find_modules(self.scripts)])
+        for member in manifest.modules:
+            self.assertTrue(os.path.isfile(manifest.blob_path(member)))
+
+    def test_tampered_archive_is_rewritten(self):
+        self.build()
+        with open(self.ts4script, 'ab') as f:
+            f.write(b'garbage')
+        self.assertTrue(self.build())
+        self.assertFalse(self.build())
+
+    def test_unchanged_build_is_not_deployed_again(self):
+        self.assertTrue(compile_module('me', self.mod, self.mods_folder, mod_name='mod', deterministic=True))
+        self.assertFalse(compile_module('me', self.mod, self.mods_folder, mod_name='mod', deterministic=True))
+
+
+class CanonicalMarshalTest(unittest.TestCase):
+
+    source = ("KEYS = {'alpha', 'beta', 'gamma', 'delta'}\n"
+              "def f(x, y=(1, 2.5, 3j, 10 ** 20, None, b'bytes')):\n"
+              "    return x in {'one', 'two', 'three'} and [y for y in x if y in KEYS]\n")
+
+    def test_roundtrip(self):
+        code = compile(self.source, 'test.py', 'exec')
+        data = canonical_marshal(marshal.dumps(code))
+        self.assertEqual(marshal.loads(data), code)
+        self.assertEqual(canonical_marshal(data), data)
+
+    def test_independent_of_hash_seed(self):
+        script = ('import marshal, sys\n'
+                  'from Utilities.mod_build import canonical_marshal\n'
+                  'code = compile(sys.argv[1], "test.py", "exec")\n'
+                  'sys.stdout.write(canonical_marshal(marshal.dumps(code)).hex())\n')
+        cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        outputs = set()
+        for seed in ('1', '2', '3'):
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            outputs.add(subprocess.check_output([sys.executable, '-c', script, self.source], cwd=cwd, env=env))
+        self.assertEqual(len(outputs), 1)
+
+
+class DeployTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.src = os.path.join(self.root, 'src')
+        self.dst = os.path.join(self.root, 'dst')
+
+    def test_deploy_file(self):
+        src, dst = os.path.join(self.root, 'a.ts4script'), os.path.join(self.dst, 'a.ts4script')
+        write(src, 'one')
+        self.assertTrue(deploy_file(src, dst))
+        mtime = os.stat(dst).st_mtime_ns
+        self.assertFalse(deploy_file(src, dst))
+        self.assertEqual(os.stat(dst).st_mtime_ns, mtime)
+        write(src, 'two')
+        self.assertTrue(deploy_file(src, dst))
+        with open(dst) as f:
+            self.assertEqual(f.read(), 'two')
+        self.assertEqual(os.listdir(self.dst), ['a.ts4script'])
+
+    def test_sync_folder(self):
+        write(os.path.join(self.src, 'a.py'), 'a')
+        write(os.path.join(self.src, 'pkg', 'b.py'), 'b')
+        write(os.path.join(self.src, '__pycache__', 'a.cpython-37.pyc'), 'bytecode')
+        self.assertEqual(sync_folder(self.src, self.dst), (2, 0))
+        self.assertFalse(os.path.exists(os.path.join(self.dst, '__pycache__')))
+        self.assertEqual(sync_folder(self.src, self.dst), (0, 0))
+
+        write(os.path.join(self.dst, '__pycache__', 'b.cpython-37.pyc'), 'game bytecode')
+        write(os.path.join(self.src, 'a.py'), 'changed')
+        shutil.rmtree(os.path.join(self.src, 'pkg'))
+        self.assertEqual(sync_folder(self.src, self.dst), (1, 1))
+        self.assertEqual(sorted(os.listdir(self.dst)), ['__pycache__', 'a.py'])
+        with open(os.path.join(self.dst, 'a.py')) as f:
+            self.assertEqual(f.read(), 'changed')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from Utilities.mod_watch import InotifyWatcher, PollingWatcher
+
+
+class WatcherTests:
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        os.makedirs(os.path.join(self.folder, 'pkg'))
+        self.watcher = self.create([self.folder])
+        self.addCleanup(self.watcher.close)
+
+    def write(self, *parts):
+        with open(os.path.join(self.folder, *parts), 'w') as f:
+            f.write('x = 1\n')
+
+    def wait_for_change(self):
+        # Returns as soon as a change is seen; the timeout only bounds a failing test
+        return self.watcher.wait(5)
+
+    def test_nothing_changed(self):
+        self.assertEqual(self.watcher.wait(0.1), set())
+
+    def test_changed_file(self):
+        self.write('pkg', 'module.py')
+        self.assertEqual(self.wait_for_change(), {self.folder})
+
+    def test_new_folder(self):
+        os.makedirs(os.path.join(self.folder, 'new', 'deep'))
+        self.write('new', 'deep', 'module.py')
+        self.assertEqual(self.wait_for_change(), {self.folder})
+
+    def test_bytecode_is_ignored(self):
+        os.makedirs(os.path.join(self.folder, '__pycache__'))
+        self.write('__pycache__', 'module.cpython-37.pyc')
+        self.assertEqual(self.watcher.wait(0.2), set())
+
+
+class PollingWatcherTest(WatcherTests, unittest.TestCase):
+
+    def create(self, folders):
+        return PollingWatcher(folders, interval=0.05)
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is Linux only')
+class InotifyWatcherTest(WatcherTests, unittest.TestCase):
+
+    def create(self, folders):
+        return InotifyWatcher(folders)
+
+    def test_folder_removed_within_burst(self):
+        path = os.path.join(self.folder, 'gone')
+        os.makedirs(path)
+        os.rmdir(path)
+        self.assertEqual(self.wait_for_change(), {self.folder})
+        self.write('pkg', 'module.py')
+        self.assertEqual(self.wait_for_change(), {self.folder})
+
+    def test_folder_removed_while_adding_watches(self):
+        # The folder was listed by os.walk but is gone by the time it is watched
+        path = os.path.join(self.folder, 'gone')
+        with mock.patch('os.walk', return_value=[(path, [], [])]):
+            self.watcher.add_tree(self.folder, path)
+        self.assertNotIn(path, [watched for folder, watched in self.watcher.watches.values()])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from Utilities import decompile_to_file, SymbolIndex
+from Utilities.unpyc3 import target_version
+
+host_is_target = sys.version_info[:2] == target_version
+
+
+class SymbolIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.ea = os.path.join(self.root, 'EA')
+        self.index = SymbolIndex.for_folder(self.ea)
+        self.addCleanup(self.index.close)
+        self.py_path = os.path.join(self.ea, 'simulation', 'objects', 'components', 'inventory.py')
+        self.index.update(self.py_path, 'digest', [
+            ('InventoryComponent', 'class', 3, ['Component', 'objects.components.types.HasInventory'], ['push']),
+            ('InventoryComponent.push_items', 'def', 7, [], ['household', 'push']),
+            ('MAX_ITEMS', 'constant', 1, [], []),
+        ])
+
+    def test_module_name_drops_archive_folder(self):
+        self.assertEqual(self.index.module_name(self.py_path), 'objects.components.inventory')
+        init = os.path.join(self.ea, 'simulation', 'objects', '__init__.py')
+        self.assertEqual(self.index.module_name(init), 'objects')
+
+    def test_defined(self):
+        expected = [('objects.components.inventory', 'InventoryComponent.push_items', 'def',
+                     'simulation/objects/components/inventory.py', 7)]
+        for name in ('push_items', 'InventoryComponent.push_items',
+                     'objects.components.inventory.InventoryComponent.push_items'):
+            with self.subTest(name=name):
+                self.assertEqual(self.index.defined(name), expected)
+
+    def test_subclasses_and_callers(self):
+        self.assertEqual([row[1] for row in self.index.subclasses('HasInventory')], ['InventoryComponent'])
+        self.assertEqual([row[1] for row in self.index.callers('push')],
+                         ['InventoryComponent', 'InventoryComponent.push_items'])
+
+    def test_is_current_and_remove(self):
+        self.assertTrue(self.index.is_current(self.py_path, 'digest'))
+        self.assertFalse(self.index.is_current(self.py_path, 'other'))
+        self.assertTrue(self.index.has_folder(os.path.join(self.ea, 'simulation')))
+        self.index.remove(self.py_path)
+        self.assertEqual(self.index.defined('push_items'), [])
+        self.assertFalse(self.index.has_folder(os.path.join(self.ea, 'simulation')))
+
+    def test_folder_without_modules(self):
+        folder = os.path.join(self.ea, 'empty')
+        self.assertFalse(self.index.has_folder(folder))
+        self.index.add_folder(folder)
+        self.assertTrue(self.index.has_folder(folder))
+
+    @unittest.skipUnless(host_is_target, 'needs a Python {}.{} host to compile modules'.format(*target_version))
+    def test_collected_lines_match_output(self):
+        source = ('LIMIT = 3\n'
+                  '\n'
+                  'class Base:\n'
+                  '    """Docs\n'
+                  '    over lines"""\n'
+                  '    def run(self):\n'
+                  '        def inner():\n'
+                  '            return helper()\n'
+                  '        return inner\n')
+        py_path = os.path.join(self.root, 'module.py')
+        code = compile(source, 'module.py', 'exec')
+        import marshal
+        from importlib.util import MAGIC_NUMBER
+        result = decompile_to_file('module.pyc', MAGIC_NUMBER + b'\0' * 12 + marshal.dumps(code), py_path,
+                                   collect_symbols=True)
+        self.assertEqual(result['status'], 'ok')
+        # Lines as editors count them, where a lone '\r' also ends a line
+        with io.open(py_path, newline='') as f:
+            lines = f.read().splitlines()
+        for qualname, kind, line, bases, refs in result['symbols']:
+            with self.subTest(qualname=qualname):
+                self.assertIn(qualname.split('.')[-1], lines[line - 1])
+        self.assertEqual([symbol[0] for symbol in result['symbols']],
+                         ['LIMIT', 'Base', 'Base.__doc__', 'Base.run', 'Base.run.<locals>.inner'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import marshal
+import os
+import struct
+import sys
+import unittest
+
+from Utilities.unpyc3 import (MarshalReader, OpcodeIndex, PycHeaderError, decompile, iscode, read_pyc,
+                              target_magic, target_version)
+
+host_is_target = sys.version_info[:2] == target_version
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def read_fixture(name, mode='rb'):
+    with open(os.path.join(fixtures, name), mode) as f:
+        return f.read()
+
+
+class OpcodeIndexTest(unittest.TestCase):
+
+    def test_next_and_prev(self):
+        index = OpcodeIndex([1, 2, 3, 2, 1])
+        self.assertEqual(index.next_op((2,), 0), 1)
+        self.assertEqual(index.next_op((2, 3), 2), 2)
+        self.assertEqual(index.next_op((4,), 0), None)
+        self.assertEqual(index.prev_op((1, 2), 2), 1)
+        self.assertEqual(index.prev_op((3,), 1), None)
+
+    def test_change(self):
+        index = OpcodeIndex([1, 2, 3, 2, 1])
+        index.change(3, 2, 9)
+        self.assertEqual(index.next_op((2,), 2), None)
+        self.assertEqual(index.prev_op((9,), 4), 3)
+
+
+@unittest.skipUnless(host_is_target, 'needs a Python {}.{} host to compile sources'.format(*target_version))
+class DecompileTest(unittest.TestCase):
+
+    def bytecode(self, code):
+        return [code.co_code] + [self.bytecode(const) for const in code.co_consts if hasattr(const, 'co_code')]
+
+    def roundtrip(self, source):
+        code = compile(source, '<test>', 'exec')
+        output = str(decompile(code))
+        self.assertEqual(self.bytecode(compile(output, '<test>', 'exec')), self.bytecode(code), output)
+
+    def test_comprehensions(self):
+        self.roundtrip('def f(items):\n'
+                       '    return [x * 2 for x in items if x], {k: v for (k, v) in items}\n')
+
+    def test_loops(self):
+        self.roundtrip('def f(items):\n'
+                       '    for x in items:\n'
+                       '        if x:\n'
+                       '            break\n'
+                       '    while x:\n'
+                       '        x -= 1\n'
+                       '    return x\n')
+
+
+class PycFixtureTest(unittest.TestCase):
+    """
+    fixtures/sample.pyc is sample.py compiled by Python 3.7 (unchecked
+    hash based), and sample.expected its decompiled output on a 3.7
+    host.  Regenerate both with a 3.7 interpreter when sample.py changes.
+    """
+
+    def setUp(self):
+        self.data = read_fixture('sample.pyc')
+
+    def test_decompile_matches_target_host(self):
+        self.assertEqual(str(decompile(self.data)), read_fixture('sample.expected', 'r'))
+        self.assertEqual(str(decompile(memoryview(self.data))), read_fixture('sample.expected', 'r'))
+
+    def test_marshal_reader_reads_code(self):
+        code = MarshalReader(memoryview(self.data)[16:]).r_object()
+        self.assertEqual((code.co_name, code.co_filename), ('<module>', 'sample.py'))
+        self.assertIn('LIMIT', code.co_names)
+        for value in (10 ** 30, 2.5, 1 - 2j, ('alpha', 'b\xe9ta', b'raw', None, True, Ellipsis)):
+            self.assertIn(value, code.co_consts)
+        nested = [const.co_name for const in code.co_consts if iscode(const)]
+        self.assertEqual(nested, ['scale', 'counter', 'Inventory'])
+
+    @unittest.skipUnless(host_is_target, 'needs a Python {}.{} host'.format(*target_version))
+    def test_marshal_reader_matches_marshal(self):
+        reader_code = MarshalReader(self.data[16:]).r_object()
+        host_code = marshal.loads(self.data[16:])
+        for name in type(reader_code).__slots__:
+            if name != 'co_consts':
+                self.assertEqual(getattr(reader_code, name), getattr(host_code, name), name)
+        self.assertEqual(len(reader_code.co_consts), len(host_code.co_consts))
+
+    @unittest.skipUnless(host_is_target, 'needs a Python {}.{} host'.format(*target_version))
+    def test_fixture_is_current(self):
+        import importlib.util
+        self.assertEqual(self.data[8:16], importlib.util.source_hash(read_fixture('sample.py')))
+
+    def test_header_errors(self):
+        cases = [
+            ('truncated', self.data[:3]),
+            ('truncated', self.data[:10]),
+            ('magic', b'\x00\x00\r\n' + self.data[4:]),
+            ('magic', self.data[:2] + b'\n\r' + self.data[4:]),
+            ('flags', self.data[:4] + struct.pack('<I', 0b100) + self.data[8:]),
+        ]
+        for reason, data in cases:
+            with self.subTest(reason=reason, size=len(data)):
+                with self.assertRaises(PycHeaderError) as cm:
+                    read_pyc(data)
+                self.assertEqual(cm.exception.reason, reason)
+                if reason != 'truncated':
+                    self.assertEqual(cm.exception.magic, data[:4])
+                    self.assertEqual(cm.exception.expected, target_magic)
+
+
+class MarshalReaderTest(unittest.TestCase):
+    """Marshal data other than code objects is the same in 3.7 and later hosts"""
+
+    def test_values(self):
+        shared = ('shared', 1)
+        for value in (None, True, False, StopIteration, Ellipsis, 0, -1, 2 ** 31, -(2 ** 100), 1.5, -2j,
+                      b'bytes', 'text', 'b\xe9ta \u2603', (), (1, 'a'), tuple(range(300)), [1, [2]],
+                      {'a': 1, 2: (3,)}, {1, 2}, frozenset({'x'}), [shared, shared]):
+            with self.subTest(value=value):
+                self.assertEqual(MarshalReader(marshal.dumps(value)).r_object(), value)
+        value = MarshalReader(marshal.dumps([shared, shared])).r_object()
+        self.assertIs(value[0], value[1])
+
+    def test_bad_data(self):
+        with self.assertRaises(ValueError):
+            MarshalReader(b'?').r_object()
+        with self.assertRaises(EOFError):
+            MarshalReader(marshal.dumps(b'bytes')[:-1]).r_object()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import sys
+import time
+
+from Utilities import compile_module, create_watcher, sync_folder, watch
+from settings import *
+
+usage = """USAGE: watch_mods.py [--debug] [--poll] [mod ...]
+Rebuilds and redeploys a mod whenever its Scripts change, like compile.py,
+or like debug_compile.py with --debug.  Watches every mod in
+My Script Mods unless mods are given; --poll polls for changes instead of
+using inotify."""
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    options = [arg for arg in args if arg.startswith('--')]
+    if set(options) - {'--debug', '--poll'}:
+        print(usage)
+        sys.exit(1)
+    mods = [arg for arg in args if not arg.startswith('--')]
+    if not mods:
+        mods = [os.path.join('My Script Mods', name) for name in sorted(os.listdir('My Script Mods'))
+                if os.path.isdir(os.path.join('My Script Mods', name, 'Scripts'))]
+    roots = {os.path.abspath(os.path.join(mod, 'Scripts')): os.path.abspath(mod) for mod in mods}
+
+    def build(folder):
+        root = roots[folder]
+        mod_name = os.path.basename(root)
+        start = time.perf_counter()
+        try:
+            if '--debug' in options:
+                copied, removed = sync_folder(folder, os.path.join(mods_folder, mod_name, 'Scripts'))
+                result = "copied %d files, removed %d" % (copied, removed)
+            else:
+                deployed = compile_module(creator_name, root, mods_folder, mod_name=mod_name,
+                                          incremental=True, deterministic=True)
+                result = "deployed" if deployed else "unchanged"
+        except Exception as ex:
+            result = "failed: %s: %s" % (type(ex).__name__, ex)
+        print("%s %s: %s in %.0f ms" % (time.strftime('%H:%M:%S'), mod_name, result,
+                                        (time.perf_counter() - start) * 1000))
+
+    # Bring every deployed mod up to date before waiting for changes
+    for folder in sorted(roots):
+        build(folder)
+    watcher = create_watcher(sorted(roots), poll='--poll' in options)
+    print("Watching %d mods with %s, Ctrl+C to stop" % (len(roots), type(watcher).__name__))
+    try:
+        watch(watcher, build)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()